@@ -0,0 +1,54 @@
+import os
+import json
+import time
+
+# ==========================================
+# 基准数据：与 baselines.json 比较，超出容差视为性能回退
+# ==========================================
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.5"))   # 允许比基准慢 50%（CI 机器波动较大）
+MIN_SLACK = 0.05   # 绝对容差（秒），避免毫秒级用例因抖动误报
+
+def timed(func, repeat=3):
+    """运行 repeat 次，返回 (最短耗时秒数, 最后一次的结果)"""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def load_baselines():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+def check(suite, results, update=False, min_slack=MIN_SLACK):
+    """打印对比表；update=True 时改写该套件的基准。返回回退的用例名列表"""
+    baselines = load_baselines()
+    expected = baselines.get(suite, {})
+    regressions = []
+    print(f"\n📊 {suite}")
+    for name, seconds in results.items():
+        base = expected.get(name)
+        if base is None:
+            print(f"  {name:<36} {seconds * 1000:9.1f} ms   (无基准)")
+            continue
+        limit = max(base * (1 + TOLERANCE), base + min_slack)
+        flag = "❌" if seconds > limit else "✅"
+        print(f"  {name:<36} {seconds * 1000:9.1f} ms   基准 {base * 1000:9.1f} ms  {flag}")
+        if seconds > limit:
+            regressions.append(name)
+
+    if update:
+        baselines[suite] = {name: round(seconds, 4) for name, seconds in results.items()}
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"💾 已更新基准: {BASELINE_FILE}")
+        return []
+    if regressions:
+        print(f"❌ 性能回退: {', '.join(regressions)}")
+    return regressions
@@ -0,0 +1,69 @@
+import os
+import sys
+import argparse
+
+# ==========================================
+# 解析器微基准：直接使用 data/ 中的真实归档文件，不走任何缓存
+# ==========================================
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import pdfplumber
+import baseline
+import stubs
+import cme_archive
+import cme_delivery
+import cme_inventory
+import cme_oi
+
+PDF_NAME = "MetalsIssuesAndStopsReport.pdf"
+
+def pick_date(date_str=None):
+    """默认用最新一天（文件最齐全）"""
+    os.chdir(stubs.REPO_ROOT)
+    return date_str or cme_archive.list_dates()[-1]
+
+def run(date_str, repeat):
+    results = {}
+    pdf_path = cme_archive.local_path(date_str, PDF_NAME)
+
+    def extract_pdf():
+        pages_text, pages_words = [], []
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                pages_text.append(page.extract_text())
+                pages_words.append(page.extract_words())
+        return pages_text, pages_words
+
+    # PDF：pdfplumber 取字 和 我们自己的解析 分开计时，便于定位瓶颈
+    results["pdf_extract"], (pages_text, pages_words) = baseline.timed(extract_pdf, repeat)
+    results["delivery_parse_text"], _ = baseline.timed(lambda: cme_delivery.parse_report_text(pages_text), repeat)
+    results["delivery_extract_records"], records = baseline.timed(lambda: cme_delivery.extract_records(pages_words), repeat)
+    print(f"📄 {date_str} 交收报告: {len(pages_words)} 页, {len(records)} 条记录")
+
+    # 库存 XLS：全部文件依次解析
+    contents = []
+    for filename in sorted(set(cme_inventory.STOCK_FILES.values())):
+        path = cme_archive.local_path(date_str, filename)
+        if path:
+            with open(path, "rb") as f:
+                contents.append(f.read())
+    results["stock_reports_parse"], rows = baseline.timed(
+        lambda: [row for c in contents for row in cme_inventory.parse_stock_report(c)], repeat)
+    print(f"📦 {len(contents)} 份库存 XLS, {len(rows)} 行")
+
+    # OI：替身服务同款的确定性响应
+    raws = [stubs.oi_payload(pid, date_str.replace("-", "")) for pid in cme_oi.OI_CONFIG.values()]
+    results["oi_parse"], _ = baseline.timed(lambda: [cme_oi.max_oi(r) for r in raws for _ in range(100)], repeat)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="解析器微基准")
+    parser.add_argument("--date", help="使用哪一天的归档文件（默认最新）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--update", action="store_true", help="用本次结果改写基准")
+    args = parser.parse_args()
+
+    results = run(pick_date(args.date), args.repeat)
+    sys.exit(1 if baseline.check("parsers", results, args.update) else 0)
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+# ==========================================
+# 端到端基准：完整流水线跑在本地替身服务上（不访问任何外部网络）
+# ==========================================
+# 临时工作目录里的 data/ 软链接到真实归档（目标日期除外），store/ 从空开始：
+# 第一遍是冷启动（全量入库 + 全部请求），第二遍是同一进程内的重跑（缓存 / 快照全部命中）
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import baseline
+import stubs
+
+STAGES = ["fetch", "inventory", "delivery", "oi", "sync", "extract"]   # analyse 需要 Gemini，不在基准内
+PIPELINE_SLACK = 0.25   # 整条流水线的绝对容差（秒）：重跑只有几十毫秒，进程 / 磁盘抖动就能翻倍
+
+def prepare_workdir(date_str):
+    """临时目录：data/ 下除目标日期外全部软链接到真实归档（月度归档包整个目录链接过去）"""
+    workdir = tempfile.mkdtemp(prefix="cme-bench-")
+    os.makedirs(os.path.join(workdir, "data"))
+    for name in sorted(os.listdir(stubs.DATA_DIR)):
+        if name < date_str or name == "packs":
+            os.symlink(os.path.join(stubs.DATA_DIR, name), os.path.join(workdir, "data", name))
+    return workdir
+
+def run(date_str, latency, rate_429, notion_rate, fail_file=None):
+    server, state, base_url = stubs.start(date_str, latency, rate_429)
+    if fail_file:
+        # 冷启动时这个文件一直 500；第二遍恢复后应该只补抓它一个
+        state.failing_files.add(fail_file)
+    workdir = prepare_workdir(date_str)
+    os.environ.update(stubs.stub_env(base_url))
+    os.environ.update({
+        "SCRAPER_API_KEY": "stub-key",
+        "CME_STORE_DIR": os.path.join(workdir, "store"),
+        "NOTION_RATE": str(notion_rate),
+    })
+    os.chdir(workdir)
+
+    # 环境变量设置好之后再导入，各模块读到的是替身地址
+    import cme_pipeline
+    import cme_trace
+    cme_trace.install()
+
+    results = {}
+    try:
+        for label in ("pipeline_cold", "pipeline_recover" if fail_file else "pipeline_rerun"):
+            print(f"\n🏁 {label}: {date_str}")
+            cme_trace.reset()
+            scraper_before = state.counts.get("scraperapi", 0)
+            started = time.perf_counter()
+            failed = cme_pipeline.run_pipeline(date_str, STAGES)
+            results[label] = time.perf_counter() - started
+            print(cme_trace.summary(cme_trace.trace(label, date_str)))
+            if fail_file and label == "pipeline_cold":
+                if "fetch" not in failed:
+                    raise RuntimeError(f"{fail_file} 注入失败后 fetch 阶段没有报错")
+                state.failing_files.clear()
+                continue
+            if failed:
+                raise RuntimeError(f"{label} 失败阶段: {', '.join(failed)}")
+            if fail_file:
+                requests_made = state.counts.get("scraperapi", 0) - scraper_before
+                print(f"🔁 恢复后 ScraperAPI 请求: {requests_made}（期望 1）")
+                if requests_made != 1:
+                    raise RuntimeError(f"恢复 {fail_file} 发了 {requests_made} 个 ScraperAPI 请求，期望 1")
+    finally:
+        server.shutdown()
+        os.chdir(stubs.REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f"\n🌐 替身请求计数: {state.counts}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="端到端流水线基准（本地替身服务）")
+    parser.add_argument("--date", default=stubs.archive_dates()[-1], help="模拟抓取的日期（默认最新归档）")
+    parser.add_argument("--latency", type=float, default=0.0, help="替身服务每个请求的额外延迟（秒）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Notion / ScraperAPI 返回 429 的概率")
+    parser.add_argument("--notion-rate", type=float, default=1000, help="Notion 令牌桶速率（默认不限速，只测自身开销）")
+    parser.add_argument("--fail-file", help="冷启动时让这个文件的 ScraperAPI 请求一直 500，第二遍测恢复（只补抓这一个）")
+    parser.add_argument("--update", action="store_true", help="用本次结果改写基准")
+    args = parser.parse_args()
+
+    results = run(args.date, args.latency, args.rate_429, args.notion_rate, args.fail_file)
+    # 注入了延迟、429 或失败文件时只看结果，不和基准比较
+    if args.latency or args.rate_429 or args.fail_file:
+        sys.exit(0)
+    sys.exit(1 if baseline.check("pipeline", results, args.update, PIPELINE_SLACK) else 0)
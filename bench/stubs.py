@@ -0,0 +1,211 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import threading
+import argparse
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================================
+# 本地替身服务：ScraperAPI / CME OI / GitHub / Notion（可注入延迟和 429）
+# ==========================================
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_ROOT, "data")
+
+def archive_dates():
+    """data/ 下的松散日期目录（替身 ScraperAPI 只从松散文件取数据）"""
+    return sorted(d for d in os.listdir(DATA_DIR) if re.fullmatch(r"\d{4}-\d{2}-\d{2}", d))
+
+class StubState:
+    """所有替身共享的状态：归档日期、注入参数、请求计数和内存中的 Notion / Git 数据"""
+
+    def __init__(self, source_date, latency=0.0, rate_429=0.0, seed=0):
+        self.source_date = source_date
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.notion_pages = {}
+        self.git_objects = {}
+        self.git_head = "0" * 40
+        self.failing_files = set()   # 这些文件的 ScraperAPI 请求一律返回 500（模拟单个文件抓取失败）
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def should_throttle(self):
+        with self.lock:
+            return self.random.random() < self.rate_429
+
+def oi_payload(product_id, cme_date):
+    """确定性的 CME Volume/Details 响应（按产品和日期生成）"""
+    rng = random.Random(f"{product_id}-{cme_date}")
+    months = ["MAY 26", "JUN 26", "JUL 26", "AUG 26", "SEP 26", "DEC 26"]
+    return {"items": [{"month": m, "totalVolume": f"{rng.randint(0, 90000):,}",
+                       "openInterest": f"{rng.randint(0, 400000):,}"} for m in months]}
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            return json.loads(raw) if raw else {}
+
+        def _send(self, status, payload=b"", headers=None, content_type="application/json"):
+            if isinstance(payload, (dict, list)):
+                payload = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _dispatch(self, method):
+            if state.latency:
+                time.sleep(state.latency)
+            # 先读完请求体：直接回 429 时残留的 body 会污染 keep-alive 连接
+            self.body = self._read_body()
+            path = urlparse(self.path).path
+            service = ("notion" if path.startswith("/v1/") else "cme" if path.startswith("/CmeWS/")
+                       else "github" if path.startswith("/repos/") else "scraperapi")
+            state.count(service)
+            if service in ("notion", "scraperapi") and state.should_throttle():
+                state.count(f"{service}_429")
+                return self._send(429, {"message": "rate limited"}, {"Retry-After": "0.05"})
+            return getattr(self, f"_{service}")(method, path)
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def do_PATCH(self):
+            self._dispatch("PATCH")
+
+        # --- ScraperAPI: 直接返回归档中 source_date 当天的文件 ---
+        def _scraperapi(self, method, path):
+            target = parse_qs(urlparse(self.path).query).get("url", [""])[0]
+            filename = target.rsplit("/", 1)[-1]
+            if filename in state.failing_files:
+                return self._send(500, {"error": "upstream failed"})
+            file_path = os.path.join(DATA_DIR, state.source_date, filename)
+            if not os.path.isfile(file_path):
+                return self._send(404, {"error": "not found"})
+            with open(file_path, "rb") as f:
+                content = f.read()
+            etag = '"%s"' % hashlib.sha256(content).hexdigest()[:16]
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304)
+            return self._send(200, content, {"ETag": etag}, "application/octet-stream")
+
+        # --- CME Volume/Details ---
+        def _cme(self, method, path):
+            m = re.match(r"/CmeWS/mvc/Volume/Details/F/(\d+)/(\d{8})/P", path)
+            if not m:
+                return self._send(404, {})
+            return self._send(200, oi_payload(*m.groups()))
+
+        # --- GitHub：只实现 Git trees 提交流程用到的接口 ---
+        def _github(self, method, path):
+            base = f"http://{self.headers['Host']}"
+            m = re.match(r"/repos/([^/]+/[^/]+)(/.*)?$", path)
+            repo_url = f"{base}/repos/{m.group(1)}"
+            rest = m.group(2) or ""
+            if rest == "":
+                return self._send(200, {"full_name": m.group(1), "url": repo_url, "default_branch": "main"})
+            if re.match(r"/git/(ref|refs)/heads/main$", rest):
+                if method == "PATCH":
+                    state.git_head = self.body["sha"]
+                return self._send(200, {"ref": "refs/heads/main", "url": f"{repo_url}/git/refs/heads/main",
+                                        "object": {"sha": state.git_head, "type": "commit",
+                                                   "url": f"{repo_url}/git/commits/{state.git_head}"}})
+            if rest.startswith("/git/commits/") and method == "GET":
+                sha = rest.rsplit("/", 1)[-1]
+                return self._send(200, {"sha": sha, "url": f"{repo_url}/git/commits/{sha}",
+                                        "tree": {"sha": "1" * 40, "url": f"{repo_url}/git/trees/{'1' * 40}"}})
+            if rest in ("/git/blobs", "/git/trees", "/git/commits") and method == "POST":
+                body = self.body
+                sha = hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()
+                state.git_objects[sha] = rest
+                return self._send(201, {"sha": sha, "url": f"{repo_url}{rest}/{sha}", "tree": [],
+                                        "message": body.get("message", "")})
+            return self._send(404, {"message": "Not Found"})
+
+        # --- Notion: 数据库查询 / 新建 / 更新页面 ---
+        def _notion(self, method, path):
+            if method == "POST" and re.match(r"/v1/databases/[^/]+/query$", path):
+                body = self.body
+                date = body.get("filter", {}).get("date", {}).get("equals")
+                results = [p for p in state.notion_pages.values()
+                           if p["properties"]["Date"]["date"]["start"] == date]
+                return self._send(200, {"results": results, "has_more": False, "next_cursor": None})
+            if method == "POST" and path == "/v1/pages":
+                body = self.body
+                page_id = f"page-{len(state.notion_pages) + 1}"
+                props = body["properties"]
+                page = {"id": page_id, "properties": {
+                    "Date": props["Date"],
+                    "Metal Type": props["Metal Type"],
+                    "Net Change": {"number": 0},
+                    "JPM/Asahi etc Stock change": {"rich_text": []},
+                }}
+                state.notion_pages[page_id] = page
+                return self._send(200, page)
+            m = re.match(r"/v1/pages/([^/]+)$", path)
+            if method == "PATCH" and m and m.group(1) in state.notion_pages:
+                return self._send(200, state.notion_pages[m.group(1)])
+            return self._send(404, {"object": "error", "message": "not found"})
+
+    return Handler
+
+def start(source_date, latency=0.0, rate_429=0.0, port=0):
+    """后台线程启动替身服务，返回 (server, state, base_url)"""
+    state = StubState(source_date, latency, rate_429)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_port}"
+
+def stub_env(base_url):
+    """让各脚本指向替身服务的环境变量"""
+    return {
+        "SCRAPER_API_URL": base_url,
+        "CME_API_URL": base_url,
+        "GITHUB_API_URL": base_url,
+        "NOTION_API_URL": f"{base_url}/v1",
+        "GH_PERSONAL_TOKEN": "stub-token",
+        # 关掉 PyGithub 内置的请求 / 写入间隔，否则 fetch 的耗时几乎全是它的 sleep
+        "GITHUB_SECONDS_BETWEEN_REQUESTS": "0",
+        "GITHUB_SECONDS_BETWEEN_WRITES": "0",
+        "NOTION_TOKEN": "stub-token",
+        "NOTION_DATABASE_ID": "stub-db",
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="启动本地替身服务（前台运行）")
+    parser.add_argument("--date", default=archive_dates()[-1], help="ScraperAPI 返回哪一天的归档文件")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求额外延迟（秒）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Notion / ScraperAPI 返回 429 的概率")
+    args = parser.parse_args()
+    server, state, base_url = start(args.date, args.latency, args.rate_429, args.port)
+    for k, v in stub_env(base_url).items():
+        print(f"export {k}={v}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(json.dumps(state.counts), file=sys.stderr)
@@ -0,0 +1,152 @@
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+# ==========================================
+# 统一命令行入口：python cme.py <子命令>
+# ==========================================
+# 每个子命令只在执行时导入自己需要的模块：pandas / pdfplumber / PyGithub / yfinance / google-genai
+# 都不会在 --help 或无关的子命令里加载，新机器上冷启动只付出实际用到的依赖的导入时间
+
+def yesterday():
+    return (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+
+def cmd_fetch(args):
+    """下载当天 CME 文件并归档到 data/ 和 GitHub"""
+    import cme_bot
+    if not cme_bot.SCRAPER_API_KEY:
+        print("❌ 致命错误: 未检测到有效的 SCRAPER_API_KEY！")
+        return 1
+    _, changed, failed = cme_bot.run_fetch(args.date)
+    print(f"成功: {len(cme_bot.METALS_FILES) - len(failed)} / 失败: {len(failed)} (新内容 {len(changed)} 个)")
+    if failed:
+        print(f"❌ 以下文件同步失败: {', '.join(failed)}")
+    return 1 if failed else 0
+
+def cmd_sync(args):
+    """同步文件链接到 Notion"""
+    import notion_sync
+    notion_sync.sync_to_notion(args.date)
+    return 0
+
+def cmd_extract(args):
+    """OI / 交收明细 / Activity Note 写入 Notion"""
+    import cme_data_update
+    cme_data_update.run_analysis(args.date)
+    return 0
+
+def cmd_analyse(args):
+    """Gemini 市场研判（给出区间时按天批量）"""
+    import cme_ai_analysis
+    import cme_archive
+    if args.start:
+        end = args.end or args.start
+        dates = [d for d in cme_archive.list_dates() if args.start <= d <= end]
+        cme_ai_analysis.run_batch(dates, args.per_request, args.concurrency)
+    else:
+        cme_ai_analysis.run_analysis(args.date)
+    return 0
+
+def cmd_backfill(args):
+    """从本地归档回填派生数据（多进程）"""
+    import cme_archive
+    import cme_backfill
+    dates = cme_archive.list_dates()
+    if not dates:
+        print("❌ data/ 中没有任何归档日期")
+        return 1
+    failed = cme_backfill.run_backfill(args.start or dates[0], args.end or dates[-1], args.workers, args.force)
+    return 1 if failed else 0
+
+def cmd_query(args):
+    """查询本地 store：库存序列 / 仓库 / 会员排名 / 明细，或启动 HTTP 查询服务"""
+    import cme_query
+    parser = argparse.ArgumentParser(prog="cme query", description=cmd_query.__doc__)
+    cme_query.add_arguments(parser)
+    return cme_query.run(parser.parse_args(args.query_args))
+
+def cmd_run(args):
+    """按依赖关系运行整条流水线（或其中几个阶段）"""
+    import cme_pipeline
+    unknown = set(args.stages) - {s.name for s in cme_pipeline.STAGES}
+    if unknown:
+        print(f"❌ 未知阶段: {', '.join(sorted(unknown))}")
+        return 2
+    print(f"🚀 流水线启动日期: {args.date}")
+    failed = cme_pipeline.run_pipeline(args.date, args.stages, args.workers)
+    if failed:
+        print(f"❌ 失败阶段: {', '.join(failed)}")
+    return 1 if failed else 0
+
+def cmd_pack(args):
+    """把已结束月份的原始文件打包"""
+    import cme_archive
+    import cme_pack
+    current = datetime.now().strftime("%Y-%m")
+    months = args.months or sorted({d[:7] for d in cme_archive.list_loose_dates() if d[:7] < current})
+    for month in months:
+        cme_pack.pack_month(month, args.prune)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cme", description="CME 金属库存 / 交收数据工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add(name, func, dated=True):
+        p = sub.add_parser(name, help=func.__doc__, description=func.__doc__)
+        if dated:
+            p.add_argument("--date", default=yesterday(), help="处理日期 YYYY-MM-DD（默认 T-1）")
+        p.set_defaults(func=func)
+        return p
+
+    add("fetch", cmd_fetch)
+    add("sync", cmd_sync)
+    add("extract", cmd_extract)
+
+    p = add("analyse", cmd_analyse)
+    p.add_argument("start", nargs="?", help="批量区间起点（不给则只分析 --date）")
+    p.add_argument("end", nargs="?")
+    p.add_argument("--per-request", type=int, default=5, help="每个请求包含的天数")
+    p.add_argument("--concurrency", type=int, default=3, help="最多同时进行的请求数")
+
+    p = add("backfill", cmd_backfill, dated=False)
+    p.add_argument("start", nargs="?")
+    p.add_argument("end", nargs="?")
+    p.add_argument("--workers", type=int, default=None, help="进程数（默认 CPU 核数）")
+    p.add_argument("--force", action="store_true", help="忽略断点，全部重新处理")
+
+    # 查询的参数由 cme_query 自己解析（cme query --help 查看），这里不提前导入
+    p = add("query", cmd_query, dated=False)
+    p.add_argument("query_args", nargs=argparse.REMAINDER, help="series / depositories / top / firm / delivery / inventory / serve")
+
+    p = add("run", cmd_run)
+    p.add_argument("stages", nargs="*", help="只运行这些阶段（fetch inventory delivery oi sync extract analyse）")
+    p.add_argument("--workers", type=int, default=4)
+
+    p = add("pack", cmd_pack, dated=False)
+    p.add_argument("months", nargs="*", help="YYYY-MM（默认：当月之前所有有松散文件的月份）")
+    p.add_argument("--prune", action="store_true", help="打包校验后删除松散文件")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    import cme_trace
+    cme_trace.install()
+    code = args.func(args)
+    # 各子命令中失败的 Notion 请求统一在这里汇报
+    notion = sys.modules.get("cme_notion")
+    if notion and notion.report_failures():
+        code = code or 1
+    if args.command not in ("query", "pack"):
+        extra = {}
+        proxy = sys.modules.get("cme_proxy")
+        if proxy and proxy.scheduler:
+            extra["scraperapi"] = proxy.scheduler.stats()
+        if args.command == "run":
+            import cme_journal
+            extra["journal"] = cme_journal.summary(args.date)
+        cme_trace.finish(args.command, getattr(args, "date", None), **extra)
+    return code
+
+if __name__ == "__main__":
+    sys.exit(main())
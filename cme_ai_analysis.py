@@ -1,105 +1,241 @@
-import os
-import yfinance as yf
+import sys
+import json
+import time
+import hashlib
+import argparse
 from datetime import datetime, timedelta
-import requests
-from google import genai
-from google.genai import types
+from concurrent.futures import ThreadPoolExecutor
+import cme_archive
+import cme_config
+import cme_notion
+import cme_prices
+import cme_store
+import cme_trace
 
 # --- 环境变量配置 ---
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
-DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
-HEADERS = {
-    "Authorization": f"Bearer {NOTION_TOKEN}", 
-    "Content-Type": "application/json", 
-    "Notion-Version": "2022-06-28"
+GOOGLE_API_KEY = cme_config.GOOGLE_API_KEY
+DATABASE_ID = cme_config.DATABASE_ID
+
+# 填入你刚才查到的准确模型代号
+MODEL_ID = "gemini-3-flash-preview"
+CACHE_DIR = "gemini_cache"
+SCHEMA_VERSION = 1   # RESPONSE_SCHEMA 变化时递增，旧缓存自动失效
+
+# 结构化输出：每条研判带上日期和品种，不再靠 [Metal] 标记切分文本
+RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "analyses": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "date": {"type": "STRING"},
+                    "metal": {"type": "STRING"},
+                    "conclusion": {"type": "STRING"},
+                },
+                "required": ["date", "metal", "conclusion"],
+            },
+        },
+    },
+    "required": ["analyses"],
 }
 
+_client = None
+
+def get_client():
+    """初始化官方 Client（整个进程共用一个）"""
+    global _client
+    if _client is None:
+        from google import genai   # 只在真正调用模型时加载 SDK（命中缓存时不需要）
+        _client = genai.Client(api_key=GOOGLE_API_KEY)
+    return _client
+
+def cache_key(full_prompt):
+    return hashlib.sha256(f"{MODEL_ID}\n{SCHEMA_VERSION}\n{full_prompt}".encode("utf-8")).hexdigest()
+
 def call_gemini_sdk_consolidated(full_prompt):
-    """使用最新的 Google GenAI SDK 一次性发送请求"""
-    
-    # 1. 初始化官方 Client
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-    
-    # 2. 填入你刚才查到的准确模型代号
-    model_id = "gemini-3-flash-preview" 
-    
+    """使用最新的 Google GenAI SDK 一次性发送请求，返回 JSON 文本；相同 prompt + 模型直接读缓存"""
+    cache_name = f"{CACHE_DIR}/{cache_key(full_prompt)}.json"
+    cached = cme_store.load_json(cache_name)
+    if cached is not None:
+        print(f"♻️ 命中 AI 缓存 ({MODEL_ID})")
+        return cached["text"]
+
+    started = time.perf_counter()
     try:
-        print(f"🚀 正在调用官方 SDK 发送请求至 {model_id}...")
-        
-        # 3. 发起请求 (官方 SDK 内部对网络波动有更好的容错处理)
-        response = client.models.generate_content(
-            model=model_id,
+        print(f"🚀 正在调用官方 SDK 发送请求至 {MODEL_ID}...")
+
+        # 发起请求 (官方 SDK 内部对网络波动有更好的容错处理)
+        from google.genai import types
+        response = get_client().models.generate_content(
+            model=MODEL_ID,
             contents=full_prompt,
             config=types.GenerateContentConfig(
                 temperature=0.2, # 宏观数据研判，温度设低一点，让结论更严谨客观
+                response_mime_type="application/json",
+                response_schema=RESPONSE_SCHEMA,
                 # thinking_config=types.ThinkingConfig(thinking_level="HIGH") # 可选：开启深度思考以获得更深度的博弈推演
             )
         )
-        return response.text
-        
+        text = response.text
     except Exception as e:
+        cme_trace.record_http("Gemini", time.perf_counter() - started, bytes_out=len(full_prompt.encode()))
         print(f"❌ AI 模型请求彻底失败: {e}")
         return None
+    # SDK 走 httpx 而不是 requests，手动记入 trace
+    cme_trace.record_http("Gemini", time.perf_counter() - started, 200,
+                          len((text or "").encode()), len(full_prompt.encode()))
+
+    # 只缓存通过校验的结果，格式不对的回复下次会重新请求
+    try:
+        parse_analyses(text)
+    except ValueError as e:
+        print(f"❌ AI 返回格式不符合 schema: {e}")
+        return None
+    cme_store.save_json(cache_name, {"model": MODEL_ID, "prompt": full_prompt, "text": text})
+    return text
+
+def parse_analyses(text):
+    """按 RESPONSE_SCHEMA 校验并返回 {(date, metal): conclusion}"""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"不是合法 JSON: {e}")
+    items = data.get("analyses") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        raise ValueError("缺少 analyses 数组")
+    result = {}
+    for item in items:
+        if not isinstance(item, dict) or not all(isinstance(item.get(k), str) for k in ("date", "metal", "conclusion")):
+            raise ValueError(f"条目格式错误: {item}")
+        if item["conclusion"].strip():
+            result[(item["date"], item["metal"])] = item["conclusion"].strip()
+    return result
+
+def inventory_notes(dates):
+    """库存引擎（cme_deltas）给出的各天库存结论 {date: {metal: note}}，与 extract 写入的 Activity Note 同源"""
+    import cme_deltas   # 依赖 pandas，只在研判时导入
+    try:
+        deltas = cme_deltas.compute()
+    except Exception as e:
+        print(f"⚠️ 库存变化计算失败，研判中不附带库存结论: {e}")
+        return {}
+    if deltas.empty:
+        return {}
+    return {d: cme_deltas.activity_notes(deltas, d) for d in dates}
+
+def collect_context(date_str, prices, notes=None):
+    """收集某天的行情和事实数据（notes 为当天库存引擎的结论），返回 (context 文本 或 None, {metal: page_id})"""
+    notes = notes or {}
+    # 一次查询取出当天所有金属的行
+    pages = cme_notion.query_date(DATABASE_ID, date_str)
+    if pages is None:
+        print(f"❌ Notion 查询失败: {date_str}")
+        return None, {}
 
-def run_analysis():
-    date_str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-    tickers = {"Gold": "GC=F", "Silver": "SI=F", "Platinum": "PL=F", "Copper": "HG=F"}
-    
     market_context = []
     notion_pages = {}
-
-    # 1. 预先收集所有行情和事实数据
-    for metal, sym in tickers.items():
+    for metal in cme_prices.TICKERS:
         try:
-            hist = yf.download(sym, period="5d", progress=False)
-            if hist.empty: continue
-            price = hist['Close'].iloc[-1].item()
-            change = (price - hist['Close'].iloc[-2].item()) / hist['Close'].iloc[-2].item() * 100
-            
-            res = requests.post(f"https://api.notion.com/v1/databases/{DATABASE_ID}/query", headers=HEADERS,
-                json={"filter": {"and": [{"property": "Date", "date": {"equals": date_str}},
-                                       {"property": "Metal Type", "select": {"equals": metal}}]}}).json()
-            
-            if res.get("results"):
-                page = res["results"][0]
+            latest = cme_prices.latest_change(prices, metal, as_of=date_str)
+            if latest is None: continue
+            price, change = latest
+
+            if metal in pages:
+                page = pages[metal]
                 notion_pages[metal] = page["id"]
-                
+
                 props = page["properties"]
                 dealer_rich_text = props.get("JPM/Asahi etc Stock change", {}).get("rich_text", [])
                 dealer_info = dealer_rich_text[0]["plain_text"] if dealer_rich_text else "暂无异动数据"
-                
-                market_context.append(f"--- {metal} ---\nPrice: {price:.2f} ({change:+.2f}%)\nDealer Facts: {dealer_info}")
-        except Exception as e: 
-            print(f"❌ {metal} 数据收集失败: {e}")
 
-    if not market_context: 
-        print("⚠️ 未收集到任何行情数据，中止研判。")
-        return
+                inventory_info = notes.get(metal, "暂无库存数据")
+                market_context.append(f"--- {metal} ---\nPrice: {price:.2f} ({change:+.2f}%)\n"
+                                      f"Inventory: {inventory_info}\nDealer Facts: {dealer_info}")
+        except Exception as e:
+            print(f"❌ {date_str} {metal} 数据收集失败: {e}")
+
+    if not market_context:
+        return None, {}
+    return f"=== {date_str} ===\n" + "\n".join(market_context), notion_pages
+
+def build_prompt(contexts):
+    """contexts: [(date, context 文本, {metal: page_id})]，可一次包含多天"""
+    wanted = "\n".join(f"- {date_str}: {', '.join(pages)}" for date_str, _, pages in contexts)
+    return ("你是顶尖宏观交易员。以下是贵金属数据：\n\n" + "\n\n".join(text for _, text, _ in contexts) +
+            "\n\n请为以下每个日期的每个品种分别提供 2 句硬核研判（date 用 YYYY-MM-DD，metal 用英文品种名）：\n" + wanted)
 
-    # 2. 构造合并 Prompt
-    full_prompt = f"你是顶尖宏观交易员。以下是 {date_str} 的贵金属数据：\n\n" + "\n".join(market_context) + \
-                  "\n\n请分别为每个品种提供 2 句硬核研判。格式严格如下：\n[Gold] 结论...\n[Silver] 结论...\n[Platinum] 结论...\n[Copper] 结论..."
+def analyse_chunk(contexts):
+    """一次请求分析一组日期，并把结果写入 Notion"""
+    full_prompt = build_prompt(contexts)
 
-    # 3. 获取 AI 研判
+    # 获取 AI 研判
     all_analysis = call_gemini_sdk_consolidated(full_prompt)
-    
-    if all_analysis:
-        print("\n--- AI 原始返回内容 ---")
-        print(all_analysis)
-        print("-----------------------\n")
-        
-        # 4. 解析并填入 Notion
+    if not all_analysis:
+        return
+    analyses = parse_analyses(all_analysis)
+
+    # 填入 Notion
+    for date_str, _, notion_pages in contexts:
         for metal, page_id in notion_pages.items():
+            part = analyses.get((date_str, metal))
+            if not part:
+                print(f"⚠️ {date_str} {metal} 缺少研判结果")
+                continue
+            if cme_notion.update_page(page_id, {"Activity Note": {"rich_text": [{"text": {"content": part}}]}}):
+                print(f"✅ {date_str} {metal} 深度研判同步成功")
+
+def load_prices():
+    """价格一次批量下载，只补缓存之后的新数据"""
+    try:
+        return cme_prices.update_prices()
+    except Exception as e:
+        print(f"❌ 价格下载失败: {e}")
+        return cme_prices.load_prices()
+
+def run_batch(dates, per_request=5, max_concurrency=3):
+    """批量研判：每 per_request 天合并成一个请求，最多 max_concurrency 个请求并行"""
+    prices = load_prices()
+    notes = inventory_notes(dates)
+    contexts = []
+    for date_str in dates:
+        text, notion_pages = collect_context(date_str, prices, notes.get(date_str))
+        if text:
+            contexts.append((date_str, text, notion_pages))
+        else:
+            print(f"⚠️ {date_str} 未收集到任何行情数据，跳过")
+    if not contexts:
+        print("⚠️ 未收集到任何行情数据，中止研判。")
+        return
+
+    chunks = [contexts[i:i + per_request] for i in range(0, len(contexts), per_request)]
+    print(f"🧠 {len(contexts)} 天 -> {len(chunks)} 个请求 (并发 {max_concurrency})")
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        for future in [pool.submit(analyse_chunk, chunk) for chunk in chunks]:
             try:
-                start_marker = f"[{metal}]"
-                if start_marker in all_analysis:
-                    part = all_analysis.split(start_marker)[1].split("[")[0].strip()
-                    requests.patch(f"https://api.notion.com/v1/pages/{page_id}", headers=HEADERS,
-                        json={"properties": {"Activity Note": {"rich_text": [{"text": {"content": part}}]}}})
-                    print(f"✅ {metal} 深度研判同步成功")
-            except Exception as e: 
-                print(f"❌ {metal} 写入失败: {e}")
-
-if __name__ == "__main__": 
-    run_analysis()
+                future.result()
+            except Exception as e:
+                print(f"❌ 批量研判失败: {e}")
+
+def run_analysis(date_str=None):
+    date_str = date_str or (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    run_batch([date_str], per_request=1, max_concurrency=1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gemini 市场研判（默认 T-1，给出区间时批量回填）")
+    parser.add_argument("start", nargs="?")
+    parser.add_argument("end", nargs="?")
+    parser.add_argument("--per-request", type=int, default=5, help="每个请求包含的天数")
+    parser.add_argument("--concurrency", type=int, default=3, help="最多同时进行的请求数")
+    args = parser.parse_args()
+
+    cme_trace.install()
+    if args.start:
+        end = args.end or args.start
+        dates = [d for d in cme_archive.list_dates() if args.start <= d <= end]
+        run_batch(dates, args.per_request, args.concurrency)
+    else:
+        run_analysis()
+    cme_trace.finish("analyse", args.start or (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"))
+    sys.exit(1 if cme_notion.report_failures() else 0)
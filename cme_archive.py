@@ -0,0 +1,139 @@
+import os
+import re
+import json
+import hashlib
+import cme_config
+
+# ==========================================
+# 本地归档 (data/) 与每日 manifest
+# ==========================================
+DATA_DIR = "data"
+MANIFEST_NAME = "manifest.json"
+DERIVED_SUFFIXES = (".parsed.json", ".tmp")   # 派生缓存，不属于归档内容
+RAW_BASE_URL = f"https://raw.githubusercontent.com/{cme_config.GITHUB_REPO}/{cme_config.GITHUB_BRANCH}/{DATA_DIR}"
+
+def sha256_bytes(content_bytes):
+    return hashlib.sha256(content_bytes).hexdigest()
+
+def manifest_path(date_str):
+    return os.path.join(DATA_DIR, date_str, MANIFEST_NAME)
+
+def load_manifest(date_str):
+    """读取某天的 manifest（松散文件或月度归档包），不存在则返回 None"""
+    content = read_stored(date_str, MANIFEST_NAME)
+    return json.loads(content) if content is not None else None
+
+def save_manifest(manifest):
+    """写入本地 manifest，返回序列化后的字节（方便一起提交到 GitHub）"""
+    content = json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True).encode("utf-8")
+    path = manifest_path(manifest["date"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return content
+
+def list_loose_dates():
+    """data/ 下的日期目录（升序）"""
+    if not os.path.isdir(DATA_DIR):
+        return []
+    return sorted(d for d in os.listdir(DATA_DIR)
+                  if re.fullmatch(r"\d{4}-\d{2}-\d{2}", d) and os.path.isdir(os.path.join(DATA_DIR, d)))
+
+def list_dates():
+    """归档中所有日期（松散目录 + 月度归档包，升序）"""
+    import cme_pack
+    return sorted(set(list_loose_dates()) | cme_pack.packed_dates())
+
+def stored_files(date_str):
+    """某天实际保存的文件名（松散文件优先，否则看归档包）"""
+    folder = os.path.join(DATA_DIR, date_str)
+    if os.path.isdir(folder):
+        return sorted(f for f in os.listdir(folder) if not f.endswith(DERIVED_SUFFIXES))
+    import cme_pack
+    return cme_pack.list_files(date_str)
+
+def is_stored(date_str, filename):
+    if os.path.exists(os.path.join(DATA_DIR, date_str, filename)):
+        return True
+    import cme_pack
+    return cme_pack.has_file(date_str, filename)
+
+def read_stored(date_str, filename):
+    """读取 date_str 目录下真实保存的文件（不做去重解析），先找松散文件再找归档包"""
+    path = os.path.join(DATA_DIR, date_str, filename)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    import cme_pack
+    return cme_pack.read_file(date_str, filename)
+
+def manifest_from_loose(date_str):
+    """为没有 manifest 的旧目录现算一份（只含哈希和大小）"""
+    files = {}
+    for filename in stored_files(date_str):
+        if filename.endswith(".json"):   # manifest 和解析缓存不属于原始文件
+            continue
+        files[filename] = make_entry(read_stored(date_str, filename), date_str)
+    return {"date": date_str, "unchanged": False, "files": files}
+
+def latest_manifest(before_date):
+    """找到 before_date 之前最近一天的 manifest，返回 (日期, manifest)"""
+    for d in reversed(list_dates()):
+        if d < before_date:
+            return d, load_manifest(d) or manifest_from_loose(d)
+    return None, None
+
+def make_entry(content_bytes, stored_in, etag=None, last_modified=None):
+    """manifest 中单个文件的记录；stored_in 指向实际保存字节的日期目录"""
+    return {
+        "sha256": sha256_bytes(content_bytes),
+        "size": len(content_bytes),
+        "etag": etag,
+        "last_modified": last_modified,
+        "stored_in": stored_in,
+    }
+
+def is_noop_day(date_str):
+    """当天所有文件都与上一交易日相同（周末 / 假日快照）"""
+    manifest = load_manifest(date_str)
+    return bool(manifest and manifest.get("unchanged"))
+
+def resolve_date(date_str, filename):
+    """返回实际保存 filename 的日期目录：优先当天的松散文件，其次按当天 manifest 指向去重前的日期；
+    当天没有 manifest（从未抓取 / 抓取失败）返回 None，不会把前一天的文件当作当天的"""
+    if is_stored(date_str, filename):
+        return date_str
+    manifest = load_manifest(date_str)
+    entry = (manifest or {}).get("files", {}).get(filename)
+    return entry["stored_in"] if entry else None
+
+def read_bytes(date_str, filename):
+    """读取某天的文件内容（按 manifest 解析去重，松散文件和归档包都支持），找不到返回 None"""
+    stored_in = resolve_date(date_str, filename)
+    return read_stored(stored_in, filename) if stored_in else None
+
+def local_path(date_str, filename):
+    """本地归档中文件的路径，找不到返回 None；只存在于归档包中的文件解压到 store/unpacked/ 后返回该路径"""
+    stored_in = resolve_date(date_str, filename)
+    if stored_in is None:
+        return None
+    path = os.path.join(DATA_DIR, stored_in, filename)
+    if os.path.exists(path):
+        return path
+    import cme_pack
+    import cme_store
+    content = cme_pack.read_file(stored_in, filename)
+    if content is None:
+        return None
+    path = os.path.join(cme_store.STORE_DIR, "unpacked", stored_in, filename)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+    return path
+
+def raw_url(date_str, filename):
+    """GitHub raw 链接；去重后的文件指向真正保存它的日期目录"""
+    stored_in = resolve_date(date_str, filename) or date_str
+    return f"{RAW_BASE_URL}/{stored_in}/{filename}"
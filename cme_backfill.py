@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cme_archive
+import cme_store
+import cme_inventory
+import cme_delivery
+
+# ==========================================
+# 历史回填：多进程处理本地 data/ 归档（不访问网络）
+# ==========================================
+STATE_NAME = "backfill/_state.json"
+REPORT_FILE = "MetalsIssuesAndStopsReport.pdf"
+FLUSH_EVERY = 16   # 主进程每收到 N 天结果批量写一次 store
+
+def parse_inventory(date_str):
+    """在子进程中解析一天的库存 XLS"""
+    rows = []
+    hashes = cme_inventory.file_hashes(date_str)
+    for filename, (content, _) in hashes.items():
+        rows.extend(cme_inventory.parse_stock_report(content))
+    return {"date": date_str, "hashes": {filename: digest for filename, (_, digest) in hashes.items()}, "rows": rows}
+
+def process_date(date_str, inventory_notes):
+    """在子进程中处理一天：PDF 解析 -> Notion 行准备；inventory_notes 由主进程的库存引擎统一算好"""
+    # 延迟导入：这两个脚本只在子进程里用到
+    import notion_sync
+    import cme_data_update
+
+    started = time.time()
+    # 1. 交收 PDF（sidecar 缓存，解析过的报告不会重复解析）
+    pdf_path = cme_archive.local_path(date_str, REPORT_FILE)
+    details, records = {}, []
+    if pdf_path:
+        details = cme_delivery.parse_report(pdf_path)
+        records = cme_delivery.report_records(pdf_path)
+
+    # 2. Notion 行（属性格式与各同步脚本一致，Activity Note 与每日 extract 同样基于 cme_deltas）
+    delivery_url = cme_archive.raw_url(date_str, REPORT_FILE)
+    notion_rows = {}
+    for metal, file_name in notion_sync.METALS.items():
+        delivery_detail = "\n".join(details.get(metal, []))
+        notion_rows[metal] = {
+            "Stock File": notion_sync.get_file_property_item(file_name, cme_archive.raw_url(date_str, file_name)),
+            "Delivery Notice": notion_sync.get_file_property_item("Delivery_Notice.pdf", delivery_url),
+            "JPM/Asahi etc Stock change": {"rich_text": [{"text": {"content": delivery_detail[:2000]}}]},
+            "Activity Note": {"rich_text": [{"text": {"content": cme_data_update.generate_activity_note(
+                metal, 0, delivery_detail, records if pdf_path else None, inventory_notes.get(metal))}}]},
+        }
+
+    return {
+        "date": date_str,
+        "records": records,
+        "notion_rows": notion_rows,
+        "seconds": round(time.time() - started, 3),
+    }
+
+def ingest_inventory(pool, dates, force=False):
+    """第一轮：并行解析库存 XLS 并入库（已入库的日期除非 force 否则跳过），返回失败的日期"""
+    ingested = cme_store.load_json(cme_inventory.INGESTED_NAME, {})
+    todo = dates if force else [d for d in dates if d not in ingested]
+    print(f"📦 库存解析: 待处理 {len(todo)} 天")
+    results, failed = [], []
+    futures = {pool.submit(parse_inventory, d): d for d in todo}
+    for future in as_completed(futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            failed.append(futures[future])
+            print(f"❌ {futures[future]} 库存解析失败: {e}")
+    cme_inventory.save_rows([row for r in results for row in r["rows"]])
+    cme_inventory.mark_ingested({r["date"]: r["hashes"] for r in results})
+    return failed
+
+def inventory_notes(dates):
+    """对全部历史只跑一次库存引擎，返回 {date: {metal: note}}"""
+    import cme_deltas
+    deltas = cme_deltas.compute()
+    if deltas.empty:
+        return {d: {} for d in dates}
+    return {d: cme_deltas.activity_notes(deltas, d) for d in dates}
+
+def flush(results, state):
+    """把一批结果写入 store，写完后才标记为已完成（中断后可安全续跑）"""
+    if not results:
+        return
+    for r in results:
+        cme_delivery.store_records(r["records"])
+        cme_store.save_json(f"notion_rows/{r['date']}.json", r["notion_rows"])
+        state[r["date"]] = {"done_at": datetime.now().isoformat(timespec="seconds"), "seconds": r["seconds"]}
+    cme_store.save_json(STATE_NAME, state)
+    results.clear()
+
+def run_backfill(start, end, workers=None, force=False):
+    """回填 [start, end] 区间内的所有归档日期，返回失败的日期列表"""
+    dates = [d for d in cme_archive.list_dates() if start <= d <= end]
+    state = cme_store.load_json(STATE_NAME, {})
+    todo = dates if force else [d for d in dates if d not in state]
+    print(f"🚀 回填 {start} ~ {end}: 共 {len(dates)} 天，待处理 {len(todo)} 天 (workers={workers or os.cpu_count()})")
+
+    started = time.time()
+    total, pending = len(todo), []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 库存先全部入库，Activity Note 的滚动窗口 / z-score 才能看到这些日期之前的历史
+        failed = ingest_inventory(pool, todo, force)
+        todo = [d for d in todo if d not in failed]
+        notes = inventory_notes(todo) if todo else {}
+
+        futures = {pool.submit(process_date, d, notes[d]): d for d in todo}
+        for i, future in enumerate(as_completed(futures), 1):
+            date_str = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed.append(date_str)
+                print(f"[{i}/{len(todo)}] ❌ {date_str}: {e}")
+                continue
+            pending.append(result)
+            print(f"[{i}/{len(todo)}] ✅ {date_str} ({result['seconds']:.2f}s)")
+            if len(pending) >= FLUSH_EVERY:
+                flush(pending, state)
+    flush(pending, state)
+
+    print(f"\n--- 回填总结 ---")
+    print(f"成功: {total - len(failed)} / 失败: {len(failed)} / 耗时: {time.time() - started:.1f}s")
+    if failed:
+        print(f"❌ 以下日期失败（重新运行即可只重试这些日期）: {', '.join(sorted(failed))}")
+    return failed
+
+if __name__ == "__main__":
+    dates = cme_archive.list_dates()
+    parser = argparse.ArgumentParser(description="从本地 data/ 归档回填派生数据")
+    parser.add_argument("start", nargs="?", default=dates[0] if dates else None)
+    parser.add_argument("end", nargs="?", default=dates[-1] if dates else None)
+    parser.add_argument("--workers", type=int, default=None, help="进程数（默认 CPU 核数）")
+    parser.add_argument("--force", action="store_true", help="忽略断点，全部重新处理")
+    args = parser.parse_args()
+    if not args.start:
+        print("❌ data/ 中没有任何归档日期")
+        sys.exit(1)
+    sys.exit(1 if run_backfill(args.start, args.end, args.workers, args.force) else 0)
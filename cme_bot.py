@@ -1,22 +1,26 @@
-import requests
 import os
 import datetime
-import time
 import sys  
+import base64
 from datetime import timedelta
-from github import Github
+from concurrent.futures import ThreadPoolExecutor
+import cme_archive
+import cme_config
+import cme_journal
+import cme_proxy
+import cme_trace
 
 # ==========================================
 # 配置区域
 # ==========================================
-GITHUB_TOKEN = os.environ.get("GH_PERSONAL_TOKEN")
-GITHUB_REPO = "Curarpikt0000/cme-data-archive"
+GITHUB_TOKEN = cme_config.GITHUB_TOKEN
+GITHUB_REPO = cme_config.GITHUB_REPO
+GITHUB_BRANCH = cme_config.GITHUB_BRANCH
+GITHUB_API_URL = cme_config.GITHUB_API_URL
 
-# ✅ 关键修复：优先读取 GitHub Secrets 注入的环境变量，如果没读到，则使用你的实际 Key 兜底
-SCRAPER_API_KEY = os.environ.get("SCRAPER_API_KEY", "0434276aa91c62e0340dcd30819f3fbf")
+SCRAPER_API_KEY = cme_config.SCRAPER_API_KEY
 
 DISPLAY_DATE = (datetime.datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-GITHUB_PATH_PREFIX = f"data/{DISPLAY_DATE}/"
 
 BASE_URL = "https://www.cmegroup.com/delivery_reports/"
 METALS_FILES = [
@@ -25,60 +29,131 @@ METALS_FILES = [
     'Zinc_Stocks.xls', 'Lead_Stocks.xls'
 ]
 
-def upload_to_github(filename, content_bytes):
-    """上传文件到 GitHub"""
+# 并发下载的线程数（实际同时在途的请求数由 cme_proxy 按 429 自适应调整）
+MAX_WORKERS = cme_proxy.CONCURRENCY
+
+def commit_files_to_github(files, date_str=DISPLAY_DATE):
+    """通过 Git Trees API 把当天所有文件合并成一次原子提交"""
     if not GITHUB_TOKEN:
         print("❌ 错误: 缺少 GH_PERSONAL_TOKEN")
         return False
+    if not files:
+        print("⚠️ 没有需要提交的文件")
+        return True
+    from github import Github, InputGitTreeElement   # PyGithub 只在提交时需要
     try:
-        g = Github(GITHUB_TOKEN)
+        g = Github(GITHUB_TOKEN, base_url=GITHUB_API_URL, **cme_config.GITHUB_THROTTLE)
         repo = g.get_repo(GITHUB_REPO)
-        target_path = GITHUB_PATH_PREFIX + filename
-        try:
-            contents = repo.get_contents(target_path)
-            repo.update_file(contents.path, f"Update {filename} {DISPLAY_DATE}", content_bytes, contents.sha)
-        except:
-            repo.create_file(target_path, f"Add {filename} {DISPLAY_DATE}", content_bytes)
-        print(f"✅ GitHub 提交成功: {filename}")
+        ref = repo.get_git_ref(f"heads/{GITHUB_BRANCH}")
+        base_commit = repo.get_git_commit(ref.object.sha)
+
+        elements = []
+        for filename, content_bytes in files.items():
+            blob = repo.create_git_blob(base64.b64encode(content_bytes).decode(), "base64")
+            elements.append(InputGitTreeElement(f"data/{date_str}/{filename}", "100644", "blob", sha=blob.sha))
+
+        tree = repo.create_git_tree(elements, base_commit.tree)
+        commit = repo.create_git_commit(f"Archive CME reports {date_str} ({len(files)} files)", tree, [base_commit])
+        ref.edit(commit.sha)
+        print(f"✅ GitHub 提交成功: {len(files)} 个文件 -> {commit.sha[:7]}")
         return True
     except Exception as e:
-        print(f"❌ GitHub 提交失败 ({filename}): {e}")
+        print(f"❌ GitHub 提交失败: {e}")
         return False
 
-def download_with_scraperapi(filename):
-    """通过 ScraperAPI 下载文件（带自动重试机制）"""
-    target_url = f"{BASE_URL}{filename}"
-    proxy_url = "http://api.scraperapi.com"
-    params = {
-        'api_key': SCRAPER_API_KEY,
-        'url': target_url,
-        'render': 'false', 
+def download_with_scraperapi(filename, scheduler, cached_entry=None):
+    """通过 ScraperAPI 下载文件（重试 / 退避 / 熔断由 cme_proxy 调度），成功返回 response（200 或 304）"""
+    # 条件请求：带上上次的 ETag / Last-Modified，源站未更新时直接返回 304，不再传输文件
+    headers = {}
+    if cached_entry:
+        if cached_entry.get("etag"):
+            headers["If-None-Match"] = cached_entry["etag"]
+        if cached_entry.get("last_modified"):
+            headers["If-Modified-Since"] = cached_entry["last_modified"]
+    print(f"正在下载: {filename}...")
+    return scheduler.get(f"{BASE_URL}{filename}", headers, keep_headers=bool(headers), label=filename)
+
+def fetch_file(filename, scheduler, cached_entry=None, date_str=DISPLAY_DATE):
+    """下载单个文件并与上一交易日比对，返回 (manifest 记录, 需要提交的字节 或 None)；失败返回 (None, None)"""
+    response = download_with_scraperapi(filename, scheduler, cached_entry)
+    if response is None:
+        return None, None
+
+    if response.status_code == 304:
+        print(f"♻️ 未更新 (304): {filename}")
+        return dict(cached_entry), None
+
+    entry = cme_archive.make_entry(
+        response.content, date_str,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+    if cached_entry and cached_entry.get("sha256") == entry["sha256"]:
+        # 内容与之前相同：沿用之前保存的位置，不重复提交
+        print(f"♻️ 内容未变化: {filename}")
+        entry["stored_in"] = cached_entry["stored_in"]
+        return entry, None
+    return entry, response.content
+
+def download_all(filenames, scheduler, previous_files=None, date_str=DISPLAY_DATE):
+    """并发下载所有文件，返回 {文件名: (manifest 记录, 新内容)}"""
+    previous_files = previous_files or {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {name: pool.submit(fetch_file, name, scheduler, previous_files.get(name), date_str)
+                   for name in filenames}
+        return {name: future.result() for name, future in futures.items()}
+
+def save_local(files, date_str=DISPLAY_DATE):
+    """把新文件写入本地 data/ 目录，供同一次运行中的后续步骤直接读取"""
+    for filename, content_bytes in files.items():
+        path = os.path.join(cme_archive.DATA_DIR, date_str, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content_bytes)
+
+def run_fetch(date_str=DISPLAY_DATE):
+    """下载当天所有文件并归档，返回 (manifest, 新内容 {文件名: 字节}, 失败文件列表)"""
+    prev_date, prev_manifest = cme_archive.latest_manifest(date_str)
+    if prev_date:
+        print(f"📒 对比基准: {prev_date} 的 manifest")
+
+    # 0. 之前的运行中已下载并提交成功的文件直接沿用日志里的 manifest 记录
+    todo = cme_journal.pending(date_str, "fetch", METALS_FILES)
+    done = {name: cme_journal.get(date_str, "fetch", name)["entry"] for name in METALS_FILES if name not in todo}
+    if done:
+        print(f"📓 日志中已完成 {len(done)} 个文件，本次只下载: {', '.join(todo) or '无'}")
+
+    # 1. 并发下载（条件请求 + 内容哈希去重）
+    scheduler = cme_proxy.start_run()
+    results = download_all(todo, scheduler, (prev_manifest or {}).get("files"), date_str)
+    failed_files = [name for name, (entry, _) in results.items() if entry is None]
+    changed = {name: content for name, (_, content) in results.items() if content is not None}
+
+    files = {**done, **{name: entry for name, (entry, _) in results.items() if entry is not None}}
+    manifest = {
+        "date": date_str,
+        "unchanged": not failed_files and all(e["stored_in"] != date_str for e in files.values()),
+        "files": {name: files[name] for name in METALS_FILES if name in files},
     }
-    
-    # ✅ 进阶优化：增加 3 次重试机制，防止 ScraperAPI 节点偶尔抽风
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            print(f"正在下载: {filename} (尝试 {attempt + 1}/{max_retries})...")
-            response = requests.get(proxy_url, params=params, timeout=60)
-            
-            if response.status_code == 200:
-                # 下载成功后立即尝试上传
-                if upload_to_github(filename, response.content):
-                    return True
-                return False
-            else:
-                print(f"⚠️ 下载失败: {filename} (状态码: {response.status_code})")
-                if attempt < max_retries - 1:
-                    time.sleep(3) # 失败后等 3 秒再试
-                    continue
-                return False
-        except Exception as e:
-            print(f"⚠️ 请求异常 ({filename}): {e}")
-            if attempt < max_retries - 1:
-                time.sleep(3)
-                continue
-            return False
+    save_local(changed, date_str)
+    manifest_bytes = cme_archive.save_manifest(manifest)
+
+    # 2. 新文件 + manifest 一次性提交；提交失败则本次下载的全部计为失败
+    #    全部未变化的日子也提交这份很小的 manifest：它指向去重前的日期，也是"这天抓取过"的唯一记录
+    committed = True
+    if not todo:
+        print("♻️ 日志显示所有文件均已归档，跳过下载和提交")
+    elif not commit_files_to_github({**changed, cme_archive.MANIFEST_NAME: manifest_bytes}, date_str):
+        committed = False
+        failed_files = list(todo)
+
+    for name, (entry, _) in results.items():
+        if entry is not None and committed:
+            cme_journal.record(date_str, "fetch", name, cme_journal.DONE, entry["sha256"], entry=entry)
+        else:
+            cme_journal.record(date_str, "fetch", name, cme_journal.FAILED)
+    cme_proxy.report(scheduler)
+    return manifest, changed, failed_files
 
 if __name__ == "__main__":
     print(f"🚀 任务启动日期: {DISPLAY_DATE}")
@@ -88,14 +163,10 @@ if __name__ == "__main__":
         sys.exit(1)
         
     total_files = len(METALS_FILES)
-    failed_files = []
+    cme_trace.install()
+    manifest, changed, failed_files = run_fetch()
+    cme_trace.finish("fetch", DISPLAY_DATE, failed=failed_files, scraperapi=cme_proxy.scheduler.stats())
 
-    for fname in METALS_FILES:
-        # 如果下载或上传任何一步失败，则计入失败名单
-        if not download_with_scraperapi(fname):
-            failed_files.append(fname)
-        time.sleep(2) # 增加一点文件间的间隔，对代理更友好
-        
     print(f"\n--- 任务总结 ---")
     print(f"成功: {total_files - len(failed_files)} / 失败: {len(failed_files)}")
 
@@ -0,0 +1,45 @@
+import os
+
+# ==========================================
+# 统一配置：所有脚本共用的 ID / 密钥 / 服务地址（均可用环境变量覆盖）
+# ==========================================
+# 只依赖标准库，任何脚本都可以随时导入而不拖慢启动
+
+# --- Notion ---
+NOTION_TOKEN = os.getenv("NOTION_TOKEN")
+DATABASE_ID = os.getenv("NOTION_DATABASE_ID", "2e047eb5fd3c80d89d56e2c1ad066138")
+NOTION_API_URL = os.getenv("NOTION_API_URL", "https://api.notion.com/v1")
+
+# --- GitHub 归档仓库 ---
+GITHUB_TOKEN = os.getenv("GH_PERSONAL_TOKEN")
+GITHUB_REPO = "Curarpikt0000/cme-data-archive"
+GITHUB_BRANCH = "main"
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+# PyGithub 默认每个请求间隔 0.25s、每次写入间隔 1s；只有本地替身服务（bench）才需要关掉
+GITHUB_THROTTLE = {name: float(os.environ[env]) for name, env in (
+    ("seconds_between_requests", "GITHUB_SECONDS_BETWEEN_REQUESTS"),
+    ("seconds_between_writes", "GITHUB_SECONDS_BETWEEN_WRITES")) if os.getenv(env)}
+
+# --- 数据源 ---
+# ✅ 关键修复：优先读取 GitHub Secrets 注入的环境变量，如果没读到，则使用你的实际 Key 兜底
+SCRAPER_API_KEY = os.getenv("SCRAPER_API_KEY", "0434276aa91c62e0340dcd30819f3fbf")
+SCRAPER_API_URL = os.getenv("SCRAPER_API_URL", "http://api.scraperapi.com")
+CME_API_URL = os.getenv("CME_API_URL", "https://www.cmegroup.com")
+
+# --- 品种 -> CME 库存报表文件名（铂 / 钯共用一份报表）---
+STOCK_FILES = {
+    "Gold": "Gold_Stocks.xls",
+    "Silver": "Silver_stocks.xls",
+    "Copper": "Copper_Stocks.xls",
+    "Aluminum": "Aluminum_Stocks.xls",
+    "Lead": "Lead_Stocks.xls",
+    "Zinc": "Zinc_Stocks.xls",
+    "Platinum": "PA-PL_Stck_Rprt.xls",
+    "Palladium": "PA-PL_Stck_Rprt.xls"
+}
+
+# --- Gemini ---
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+# --- 本地派生数据 ---
+STORE_DIR = os.getenv("CME_STORE_DIR", "store")
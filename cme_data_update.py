@@ -1,40 +1,25 @@
 import os
-import re
+import sys
 import requests
-import pdfplumber
-import pandas as pd
 from datetime import datetime, timedelta
+import cme_archive
+import cme_config
+import cme_delivery
+import cme_oi
+import cme_notion
+import cme_journal
+import cme_trace
 
 # --- 配置 ---
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
-DATABASE_ID = os.getenv("NOTION_DATABASE_ID") # 已修改为读取环境变量
-HEADERS = {"Authorization": f"Bearer {NOTION_TOKEN}", "Content-Type": "application/json", "Notion-Version": "2022-06-28"}
+DATABASE_ID = cme_config.DATABASE_ID
 
-# 做市商名单
-MARKET_MAKERS = ['JPMORGAN', 'CITI', 'HSBC', 'SCOTIA', 'BOFA', 'WELLS', 'STONEX']
 # CME OI 产品 ID
-OI_CONFIG = {
-    "Gold": 437, "Silver": 450, "Copper": 446, "Platinum": 462, 
-    "Palladium": 464, "Aluminum": 8416, "Zinc": 8417, "Lead": 8418
-}
-
-def get_cme_oi(product_id, date_str):
-    """从 CME 网站抓取 Open Interest"""
-    try:
-        cme_date = date_str.replace("-", "")
-        url = f"https://www.cmegroup.com/CmeWS/mvc/Volume/Details/F/{product_id}/{cme_date}/P"
-        r = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=15)
-        data = r.json()
-        if 'items' in data:
-            oi_list = [int(str(i.get('openInterest', 0)).replace(',', '')) for i in data['items'] if i.get('openInterest')]
-            return max(oi_list) if oi_list else 0
-    except: return 0
-    return 0
+OI_CONFIG = cme_oi.OI_CONFIG
 
 def download_pdf_from_github(date_str, filename="MetalsIssuesAndStopsReport.pdf"):
     """从自己的 GitHub 仓库下载当日归档的 PDF"""
     print(f"正在从云端拉取 {filename} ...")
-    url = f"https://raw.githubusercontent.com/Curarpikt0000/cme-data-archive/main/data/{date_str}/{filename}"
+    url = cme_archive.raw_url(date_str, filename)
     try:
         res = requests.get(url, timeout=30)
         if res.status_code == 200:
@@ -45,70 +30,118 @@ def download_pdf_from_github(date_str, filename="MetalsIssuesAndStopsReport.pdf"
         print(f"拉取 PDF 失败: {e}")
     return False
 
-def parse_delivery_report(metal_name, date_str):
-    """解析 PDF 查找做市商异动"""
-    pdf_path = "MetalsIssuesAndStopsReport.pdf"
+def locate_report(date_str, filename="MetalsIssuesAndStopsReport.pdf"):
+    """当日交收报告的本地路径：优先本地归档，没有则从 GitHub 拉取"""
+    pdf_path = cme_archive.local_path(date_str, filename) or filename
     
     # 增加逻辑：如果本地没有，去 GitHub 拉取
     if not os.path.exists(pdf_path): 
         if not download_pdf_from_github(date_str, pdf_path):
-            return ""
-            
-    details = []
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            search_key = metal_name.upper()
-            for page in pdf.pages:
-                text = page.extract_text()
-                if not text or search_key not in text: continue
-                
-                lines = text.split('\n')
-                for line in lines:
-                    if any(mm in line.upper() for mm in MARKET_MAKERS):
-                        clean_line = re.sub(r'\s+', ' ', line).strip()
-                        details.append(f"🚚 {clean_line}")
-    except: pass
-    return "\n".join(list(set(details))[:15])
+            return None
+    return pdf_path
+
+def parse_delivery_report(metal_name, date_str):
+    """解析 PDF 查找做市商异动（整份报告只解析一次，所有金属共用结果）"""
+    pdf_path = locate_report(date_str)
+    if not pdf_path:
+        return ""
+    return cme_delivery.delivery_details(pdf_path, metal_name)
 
-def generate_activity_note(metal, change_val, delivery_txt):
-    """根据数据生成逻辑分析"""
+def generate_activity_note(metal, change_val, delivery_txt, records=None, inventory_note=None):
+    """根据数据生成逻辑分析；inventory_note 为库存引擎基于全部历史给出的结论"""
     note = "⚖️ Neutral"
-    if change_val < 0: note = "📉 Drawdown (去库)"
+    if inventory_note: note = inventory_note
+    elif change_val < 0: note = "📉 Drawdown (去库)"
     elif change_val > 0: note = "📦 Inflow (累库)"
     
-    if "JPMORGAN" in delivery_txt:
+    if records is not None:
+        # 有结构化记录时直接用 JPM 的实际交收手数
+        issued, stopped = cme_delivery.firm_activity(records, metal, "JP MORGAN")
+        if stopped > issued:
+            note += f" | JPM 强力接货 {stopped} 手"
+        elif issued > stopped:
+            note += f" | JPM 交货 {issued} 手"
+    elif "JPMORGAN" in delivery_txt.upper().replace(" ", ""):
         if "Stop" in delivery_txt or "接货" in delivery_txt:
             note += " | JPM 强力接货"
     return note
 
-def run_analysis():
-    date_str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+def run_analysis(date_str=None, records=None, oi_values=None):
+    """records / oi_values 可由流水线的上游阶段直接传入，缺省时自行解析和抓取"""
+    date_str = date_str or (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    if records is None:
+        pdf_path = locate_report(date_str)
+        if pdf_path:
+            try:
+                records = cme_delivery.ingest_report(pdf_path)
+            except Exception as e:
+                print(f"⚠️ 交收记录入库失败: {e}")
     
-    for metal, pid in OI_CONFIG.items():
-        print(f"Analyzing {metal}...")
-        oi_val = get_cme_oi(pid, date_str)
+    # 库存变化 / 划转 / 异动：对全部历史一次性计算（backfill 子进程只用 generate_activity_note，不需要 pandas）
+    import cme_deltas
+    inventory_notes = {}
+    try:
+        deltas = cme_deltas.compute()
+        if not deltas.empty:
+            inventory_notes = cme_deltas.activity_notes(deltas, date_str)
+    except Exception as e:
+        print(f"⚠️ 库存变化计算失败，改用 Notion 中的 Net Change: {e}")
+
+    # 所有品种的 OI 并发抓取（带本地缓存）；抓取失败为 None，不写入 Notion
+    if oi_values is None:
+        oi_values = cme_oi.oi_values(date_str)
+
+    # 输入与日志中已成功写入的那次完全相同的品种直接跳过
+    todo = {}
+    for metal in OI_CONFIG:
         delivery_detail = parse_delivery_report(metal, date_str) # 传入日期以便下载
-        
-        query_res = requests.post(f"https://api.notion.com/v1/databases/{DATABASE_ID}/query", headers=HEADERS, 
-                                 json={"filter": {"and": [{"property": "Date", "date": {"equals": date_str}},
-                                                        {"property": "Metal Type", "select": {"equals": metal}}]}}).json()
-        
-        if query_res.get("results"):
-            page = query_res["results"][0]
+        jpm = cme_delivery.firm_activity(records, metal, "JP MORGAN") if records is not None else None
+        digest = cme_journal.output_hash([oi_values.get(metal), delivery_detail, inventory_notes.get(metal), jpm])
+        if not cme_journal.is_done(date_str, "extract", metal, digest):
+            todo[metal] = (delivery_detail, digest)
+    if not todo:
+        print(f"📓 {date_str} 所有品种均已提取，跳过")
+        return
+
+    # 一次查询取出当天所有金属的行（为了读取 Net Change 生成 Note）
+    pages = cme_notion.query_date(DATABASE_ID, date_str)
+    if pages is None:
+        print(f"❌ Notion 查询失败: {date_str}")
+        return
+
+    for metal, (delivery_detail, digest) in todo.items():
+        with cme_trace.timer("metal", f"extract:{metal}"):
+            print(f"Analyzing {metal}...")
+            oi_val = oi_values.get(metal)
+            if metal not in pages:
+                # 当天的行还没建好（sync 未完成），下次重跑时再处理
+                cme_journal.record(date_str, "extract", metal, cme_journal.SKIPPED, digest, reason="no notion row")
+                continue
+
+            page = pages[metal]
             pid_notion = page["id"]
             net_change = page["properties"].get("Net Change", {}).get("number") or 0
             
-            activity_note = generate_activity_note(metal, net_change, delivery_detail)
+            activity_note = generate_activity_note(metal, net_change, delivery_detail, records, inventory_notes.get(metal))
             
-            update_data = {
-                "properties": {
-                    "OI (Open Interest)": {"number": oi_val},
-                    "JPM/Asahi etc Stock change": {"rich_text": [{"text": {"content": delivery_detail[:2000]}}]},
-                    "Activity Note": {"rich_text": [{"text": {"content": activity_note}}]}
-                }
+            properties = {
+                "JPM/Asahi etc Stock change": {"rich_text": [{"text": {"content": delivery_detail[:2000]}}]},
+                "Activity Note": {"rich_text": [{"text": {"content": activity_note}}]}
             }
-            requests.patch(f"https://api.notion.com/v1/pages/{pid_notion}", headers=HEADERS, json=update_data)
-            print(f"✅ {metal} Analysis Updated.")
+            if oi_val is None:
+                print(f"⚠️ {metal} OI 抓取失败，本次不更新 OI")
+            else:
+                properties["OI (Open Interest)"] = {"number": oi_val}
+            if cme_notion.update_page(pid_notion, properties):
+                print(f"✅ {metal} Analysis Updated.")
+                # OI 缺失的品种记为失败，重跑时会重新抓取 OI
+                status = cme_journal.DONE if oi_val is not None else cme_journal.FAILED
+            else:
+                status = cme_journal.FAILED
+            cme_journal.record(date_str, "extract", metal, status, digest)
 
 if __name__ == "__main__":
+    cme_trace.install()
     run_analysis()
+    cme_trace.finish("extract", (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"))
+    sys.exit(1 if cme_notion.report_failures() else 0)
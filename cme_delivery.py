@@ -0,0 +1,212 @@
+import os
+import re
+import json
+from datetime import datetime
+import cme_archive
+import cme_store
+import cme_trace
+
+# ==========================================
+# MetalsIssuesAndStopsReport 单次解析（所有金属共用）
+# ==========================================
+# 做市商名单（不含空格：报告里印的是 "JP MORGAN SECURITIES"，匹配时去掉行内空格）
+MARKET_MAKERS = ['JPMORGAN', 'CITI', 'HSBC', 'SCOTIA', 'BOFA', 'WELLS', 'STONEX']
+METALS = ["Gold", "Silver", "Copper", "Platinum", "Palladium", "Aluminum", "Zinc", "Lead"]
+
+SIDECAR_SUFFIX = ".parsed.json"
+PARSER_VERSION = 3   # 解析逻辑变化时递增，旧的 sidecar 自动失效
+MAX_LINES = 15       # 每个品种最多保留 15 行
+
+DATASET = "delivery"
+INDEX_NAME = "delivery/_index.json"
+RECORD_COLUMNS = ["date", "commodity", "contract", "contract_month", "firm_number",
+                  "firm_name", "account", "issued", "stopped"]
+ACCOUNT_TYPES = {"H": "house", "C": "customer"}
+NUMBER_RE = re.compile(r'^[\d,]+$')
+
+_memory_cache = {}
+
+def contract_metal(contract_line):
+    """CONTRACT: APRIL 2026 COMEX 100 GOLD FUTURES -> Gold"""
+    upper = contract_line.upper()
+    for metal in METALS:
+        if metal.upper() in upper:
+            return metal
+    return None
+
+def contract_series(contract):
+    """CONTRACT 行 -> "standard" / "micro"（MICRO GOLD 每手 10 盎司、MICRO SILVER 1000 盎司，不能和标准合约的手数相加）"""
+    return "micro" if "MICRO" in (contract or "").upper() else "standard"
+
+def parse_report_text(pages_text):
+    """按 CONTRACT 分段，一次性提取所有品种的做市商行（保持报告中的先后顺序）"""
+    details = {metal: [] for metal in METALS}
+    current = None
+    for text in pages_text:
+        for line in (text or "").split('\n'):
+            if line.startswith("CONTRACT:"):
+                current = contract_metal(line)
+                continue
+            if current is None:
+                continue
+            compact = line.upper().replace(" ", "")
+            if any(mm in compact for mm in MARKET_MAKERS):
+                clean_line = re.sub(r'\s+', ' ', line).strip()
+                details[current].append(f"🚚 {clean_line}")
+    # 去重但保留顺序，结果稳定可复现
+    return {metal: list(dict.fromkeys(lines))[:MAX_LINES] for metal, lines in details.items()}
+
+def group_lines(words, tolerance=3):
+    """把 extract_words 的结果按纵坐标聚成行"""
+    lines = []
+    for word in sorted(words, key=lambda w: (w["top"], w["x0"])):
+        if lines and abs(lines[-1][0]["top"] - word["top"]) <= tolerance:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+    return [sorted(line, key=lambda w: w["x0"]) for line in lines]
+
+def extract_records(pages_words):
+    """按列位置把交收表格解析成结构化记录（ISSUED / STOPPED 靠表头横坐标区分）"""
+    records = []
+    business_date = contract = commodity = contract_month = None
+    split_x = name_end_x = None
+    for words in pages_words:
+        for line in group_lines(words):
+            texts = [w["text"] for w in line]
+            if texts[:2] == ["BUSINESS", "DATE:"]:
+                business_date = datetime.strptime(texts[2], "%m/%d/%Y").strftime("%Y-%m-%d")
+            elif texts[0] == "CONTRACT:":
+                contract = " ".join(texts[1:])
+                commodity = contract_metal(contract)
+                try:
+                    contract_month = datetime.strptime(" ".join(texts[1:3]), "%B %Y").strftime("%Y-%m")
+                except ValueError:
+                    contract_month = None
+            elif "ISSUED" in texts and "STOPPED" in texts:
+                issued = line[texts.index("ISSUED")]
+                stopped = line[texts.index("STOPPED")]
+                # 数字右对齐：右边界落在两个表头右边界中点左侧的是 ISSUED
+                split_x = (issued["x1"] + stopped["x1"]) / 2
+                name_end_x = issued["x0"] - 10
+            elif (split_x is not None and commodity and len(texts) >= 3
+                    and texts[0].isdigit() and texts[1] in ACCOUNT_TYPES):
+                name_words = [w["text"] for w in line[2:] if w["x1"] < name_end_x]
+                numbers = [w for w in line[2:] if w["x1"] >= name_end_x and NUMBER_RE.match(w["text"])]
+                record = {
+                    "date": business_date, "commodity": commodity, "contract": contract,
+                    "contract_month": contract_month, "firm_number": texts[0],
+                    "firm_name": " ".join(name_words), "account": ACCOUNT_TYPES[texts[1]],
+                    "issued": 0, "stopped": 0,
+                }
+                for w in numbers:
+                    record["issued" if w["x1"] < split_x else "stopped"] += int(w["text"].replace(",", ""))
+                records.append(record)
+    return records
+
+def parse_report(pdf_path):
+    """解析整份 PDF，结果缓存在旁边的 sidecar 文件中（以 PDF 的 sha256 为键）"""
+    return _parse_cached(pdf_path)["metals"]
+
+def report_records(pdf_path):
+    """整份报告的结构化 Issues/Stops 记录"""
+    return _parse_cached(pdf_path)["records"]
+
+def _parse_cached(pdf_path):
+    with open(pdf_path, 'rb') as f:
+        digest = cme_archive.sha256_bytes(f.read())
+    if digest in _memory_cache:
+        return _memory_cache[digest]
+
+    sidecar = pdf_path + SIDECAR_SUFFIX
+    if os.path.exists(sidecar):
+        try:
+            with open(sidecar, encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("sha256") == digest and cached.get("version") == PARSER_VERSION:
+                _memory_cache[digest] = cached
+                return cached
+        except ValueError:
+            pass
+
+    import pdfplumber   # 命中 sidecar 缓存时不需要加载 pdfplumber
+    with cme_trace.timer("parse", "pdf"):
+        pages_text, pages_words = [], []
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                pages_text.append(page.extract_text())
+                pages_words.append(page.extract_words())
+        result = {
+            "sha256": digest,
+            "version": PARSER_VERSION,
+            "metals": parse_report_text(pages_text),
+            "records": extract_records(pages_words),
+        }
+
+    with open(sidecar, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    _memory_cache[digest] = result
+    return result
+
+def ingest_report(pdf_path):
+    """把一份报告的记录写入 store/delivery（按 BUSINESS DATE 分区）并更新 firm/commodity 索引"""
+    records = report_records(pdf_path)
+    store_records(records)
+    return records
+
+def store_records(records):
+    """写入一份报告的记录（同一 BUSINESS DATE 覆盖写）并更新索引"""
+    import pandas as pd
+    if not records:
+        return
+    business_date = records[0]["date"]
+    cme_store.write_partition(DATASET, business_date, pd.DataFrame(records, columns=RECORD_COLUMNS))
+
+    index = cme_store.load_json(INDEX_NAME, {})
+    for r in records:
+        dates = index.setdefault(r["firm_name"], {}).setdefault(r["commodity"], [])
+        if business_date not in dates:
+            dates.append(business_date)
+            dates.sort()
+    cme_store.save_json(INDEX_NAME, index)
+
+def query_records(firm=None, commodity=None, since=None, until=None):
+    """按 firm（名称子串，忽略空格）/ commodity / 日期范围查询，只读取索引命中的分区"""
+    index = cme_store.load_json(INDEX_NAME, {})
+    key = firm.upper().replace(" ", "") if firm else None
+    firms = [name for name in index if key is None or key in name.replace(" ", "")]
+    dates = set()
+    for name in firms:
+        for metal, metal_dates in index[name].items():
+            if commodity is None or metal == commodity:
+                dates.update(metal_dates)
+    dates = [d for d in dates if (since is None or d >= since) and (until is None or d <= until)]
+    df = cme_store.read_partitions(DATASET, dates)
+    if df.empty:
+        import pandas as pd
+        return pd.DataFrame(columns=RECORD_COLUMNS)
+    mask = df["firm_name"].isin(firms)
+    if commodity:
+        mask &= df["commodity"] == commodity
+    return df[mask].reset_index(drop=True)
+
+def firm_activity(records, metal, firm, series="standard"):
+    """某品种中某个做市商（名称子串，忽略空格）当天的 (issued, stopped) 合计，只算 series 这一档合约的手数"""
+    key = firm.upper().replace(" ", "")
+    issued = stopped = 0
+    for r in records:
+        if (r["commodity"] == metal and contract_series(r["contract"]) == series
+                and key in r["firm_name"].replace(" ", "")):
+            issued += r["issued"]
+            stopped += r["stopped"]
+    return issued, stopped
+
+def delivery_details(pdf_path, metal_name):
+    """某个品种的做市商交收明细（多行文本），PDF 不存在或解析失败返回空字符串"""
+    if not os.path.exists(pdf_path):
+        return ""
+    try:
+        return "\n".join(parse_report(pdf_path).get(metal_name, []))
+    except Exception as e:
+        print(f"⚠️ 解析交收报告失败 ({pdf_path}): {e}")
+        return ""
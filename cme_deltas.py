@@ -0,0 +1,79 @@
+import sys
+import numpy as np
+import pandas as pd
+import cme_inventory
+
+# ==========================================
+# 库存变化 / 异动引擎：对全部历史做一次向量化计算
+# ==========================================
+KEYS = ["metal", "depository"]
+WINDOW = 5           # 滚动窗口（交易日）
+Z_WINDOW = 20        # z-score 取前 N 个交易日的日变化做基准
+Z_MIN_PERIODS = 5
+Z_THRESHOLD = 3.0
+
+def compute(inventory=None, window=WINDOW, z_window=Z_WINDOW, z_threshold=Z_THRESHOLD):
+    """在 cme_inventory.load_inventory() 的结果上追加变化量、划转和 z-score 列"""
+    df = cme_inventory.load_inventory() if inventory is None else inventory
+    df = df.sort_values(KEYS + ["report_date"], ignore_index=True)
+    g = df.groupby(KEYS, sort=False)
+
+    # 1. 日变化和滚动窗口变化
+    for col in ("registered", "eligible", "total"):
+        df[f"{col}_delta"] = g[col].diff().round(3)   # 原始数据保留 3 位小数，去掉浮点误差
+        df[f"{col}_delta_{window}d"] = (df[col] - g[col].shift(window)).round(3)
+
+    # 2. Registered <-> Eligible 划转：报表 ADJUSTMENT 列，正数表示 Eligible -> Registered
+    df["transfer_to_registered"] = df["registered_adjustment"]
+
+    # 3. 每个仓库日变化的 z-score（基准只用当天之前的数据）
+    baseline = g["total_delta"].shift(1).groupby([df["metal"], df["depository"]], sort=False)
+    rolling = baseline.rolling(z_window, min_periods=Z_MIN_PERIODS)
+    mean = rolling.mean().reset_index(level=[0, 1], drop=True).sort_index()
+    std = rolling.std().reset_index(level=[0, 1], drop=True).sort_index()
+    df["total_z"] = ((df["total_delta"] - mean) / std.replace(0, np.nan)).replace([np.inf, -np.inf], np.nan)
+    df["anomaly"] = df["total_z"].abs() >= z_threshold
+    return df
+
+def snapshot(deltas, as_of):
+    """截至 as_of（含）最近一个报告日的全部行"""
+    dates = deltas.loc[deltas["report_date"] <= as_of, "report_date"]
+    if dates.empty:
+        return deltas.iloc[0:0]
+    return deltas[deltas["report_date"] == dates.max()]
+
+def activity_notes(deltas, as_of, window=WINDOW):
+    """按金属生成 Activity Note 的库存部分 {metal: note}"""
+    day = snapshot(deltas, as_of)
+    notes = {}
+    for metal, rows in day.groupby("metal"):
+        total = rows[rows["depository"] == cme_inventory.TOTAL_DEPOSITORY]
+        if total.empty:
+            continue
+        total = total.iloc[0]
+        change = total["total_delta"] if pd.notna(total["total_delta"]) else total["net_change"]
+        note = "⚖️ Neutral"
+        if change < 0: note = "📉 Drawdown (去库)"
+        elif change > 0: note = "📦 Inflow (累库)"
+        if change:
+            note += f" {change:+,.0f}"
+        if pd.notna(total[f"total_delta_{window}d"]) and total[f"total_delta_{window}d"]:
+            note += f" | {window}日 {total[f'total_delta_{window}d']:+,.0f}"
+
+        transfer = total["transfer_to_registered"]
+        if transfer > 0:
+            note += f" | 🔁 Eligible→Registered {transfer:,.0f}"
+        elif transfer < 0:
+            note += f" | 🔁 Registered→Eligible {-transfer:,.0f}"
+
+        anomalies = rows[rows["anomaly"] & (rows["depository"] != cme_inventory.TOTAL_DEPOSITORY)]
+        for _, row in anomalies.reindex(anomalies["total_z"].abs().sort_values(ascending=False).index).head(2).iterrows():
+            note += f" | ⚠️ {row['depository']} {row['total_delta']:+,.0f} ({row['total_z']:+.1f}σ)"
+        notes[metal] = note
+    return notes
+
+if __name__ == "__main__":
+    deltas = compute()
+    as_of = sys.argv[1] if len(sys.argv) > 1 else deltas["report_date"].max()
+    for metal, note in activity_notes(deltas, as_of).items():
+        print(f"{metal}: {note}")
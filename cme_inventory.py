@@ -0,0 +1,143 @@
+import re
+import sys
+from datetime import datetime
+import cme_archive
+import cme_config
+import cme_store
+import cme_trace
+
+# ==========================================
+# 库存 XLS -> 按金属分区的 Parquet 时间序列（增量入库）
+# ==========================================
+STOCK_FILES = cme_config.STOCK_FILES
+DATASET = "inventory"
+INGESTED_NAME = "inventory/_ingested.json"
+TOTAL_DEPOSITORY = "TOTAL"   # 报表底部的合计行
+
+VALUE_COLUMNS = ["prev_total", "received", "withdrawn", "net_change", "adjustment", "total_today"]
+COLUMNS = ["report_date", "activity_date", "metal", "depository",
+           "registered", "pledged", "eligible", "total",
+           "prev_total", "received", "withdrawn", "net_change", "adjustment",
+           "registered_net_change", "registered_adjustment",
+           "eligible_net_change", "eligible_adjustment"]
+DATE_RE = re.compile(r'(Report|Activity) Date:\s*(\d{1,2}/\d{1,2}/\d{4})')
+
+def row_category(label, metal):
+    """Registered / Eligible / Pledged / Total 行（含底部合计行），返回 (category, 是否合计行)"""
+    text = label.lower()
+    is_total = text.startswith("total ") or text.startswith("combined total")
+    for category in ("registered", "eligible", "pledged"):
+        if text.startswith(category) or text.startswith(f"total {category}"):
+            return category, is_total
+    if text in ("total", "combined total", f"total {metal.lower()}"):
+        return "total", text != "total"
+    return None, False
+
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) else 0.0
+
+def parse_stock_report(content_bytes):
+    """解析一份库存 XLS，返回每个金属、每个仓库一行的记录列表"""
+    import xlrd
+    sheet = xlrd.open_workbook(file_contents=content_bytes).sheet_by_index(0)
+    rows, current = [], None
+    metal = depository = None
+    dates = {}
+    for r in range(sheet.nrows):
+        values = sheet.row_values(r)
+        label = str(values[0]).strip()
+        for cell in values:
+            m = DATE_RE.search(str(cell))
+            if m:
+                dates[m.group(1)] = datetime.strptime(m.group(2), "%m/%d/%Y").strftime("%Y-%m-%d")
+        if not label:
+            continue
+
+        section = label.upper().split(" - ")[0]
+        if section.title() in STOCK_FILES:
+            metal, depository = section.title(), None
+            continue
+        if metal is None or label.upper() in ("DEPOSITORY", "DELIVERY POINT"):
+            continue
+
+        numbers = values[2:8]
+        if not any(isinstance(v, (int, float)) for v in numbers):
+            depository = label   # 仓库名称行
+            continue
+        category, is_total = row_category(label, metal)
+        if category is None:
+            continue
+        name = TOTAL_DEPOSITORY if is_total else depository
+        if current is None or (current["metal"], current["depository"]) != (metal, name):
+            current = {c: 0.0 for c in COLUMNS[4:]}
+            current.update({"report_date": dates.get("Report"), "activity_date": dates.get("Activity"),
+                            "metal": metal, "depository": name})
+            rows.append(current)
+
+        cells = dict(zip(VALUE_COLUMNS, (_number(v) for v in numbers)))
+        current[category] = cells["total_today"]
+        if category == "total":
+            for col in VALUE_COLUMNS[:-1]:
+                current[col] = cells[col]
+        elif category in ("registered", "eligible"):
+            current[f"{category}_net_change"] = cells["net_change"]
+            current[f"{category}_adjustment"] = cells["adjustment"]
+    return rows
+
+def file_hashes(date_str):
+    """某天的库存文件 {文件名: (内容, sha256)}（松散文件或归档包）"""
+    files = {}
+    for filename in sorted(set(STOCK_FILES.values())):
+        content = cme_archive.read_bytes(date_str, filename)
+        if content is not None:
+            files[filename] = (content, cme_archive.sha256_bytes(content))
+    return files
+
+def ingest_new_dates(dates=None):
+    """只处理 store 中还没有的归档日期；同一份文件（周末快照）不会重复解析"""
+    state = cme_store.load_json(INGESTED_NAME, {})
+    seen_hashes = {h for files in state.values() for h in files.values()}
+    todo = [d for d in (dates or cme_archive.list_dates()) if d not in state]
+    new_rows = []
+    for date_str in todo:
+        files = file_hashes(date_str)
+        for filename, (content, digest) in files.items():
+            if digest in seen_hashes:
+                continue   # 与之前某天完全相同，无需再解析
+            with cme_trace.timer("parse", "xls"):
+                new_rows.extend(parse_stock_report(content))
+            seen_hashes.add(digest)
+        state[date_str] = {filename: digest for filename, (_, digest) in files.items()}
+
+    save_rows(new_rows)
+    cme_store.save_json(INGESTED_NAME, state)
+    return todo
+
+def save_rows(rows):
+    """每个金属一个文件，按 report_date 合并（同一报告日期的旧数据被替换）"""
+    import pandas as pd
+    if not rows:
+        return
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    for metal, metal_df in df.groupby("metal"):
+        cme_store.upsert_table(f"{DATASET}/metal={metal}", metal_df, "report_date")
+
+def mark_ingested(date_hashes):
+    """记录已入库的归档日期 {日期: {文件名: sha256}}"""
+    state = cme_store.load_json(INGESTED_NAME, {})
+    state.update(date_hashes)
+    cme_store.save_json(INGESTED_NAME, state)
+
+def load_inventory(metal=None):
+    """读取全部历史（可按金属过滤），按 report_date / metal / depository 排序"""
+    import pandas as pd
+    metals = [metal] if metal else list(STOCK_FILES)
+    frames = [cme_store.read_table(f"{DATASET}/metal={m}") for m in metals]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True).sort_values(["report_date", "metal", "depository"], ignore_index=True)
+
+if __name__ == "__main__":
+    processed = ingest_new_dates(sys.argv[1:] or None)
+    print(f"🎉 本次处理 {len(processed)} 个日期")
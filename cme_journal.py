@@ -0,0 +1,61 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+import cme_store
+
+# ==========================================
+# 运行日志：按日期记录每个 阶段×单元（文件 / 品种）的状态和输出哈希，重跑时只补失败或缺失的单元
+# ==========================================
+# store/journal/<date>.json -> {stage: {unit: {"status", "hash", "at", ...}}}
+JOURNAL_DIR = "journal"
+DONE, FAILED, SKIPPED = "done", "failed", "skipped"   # skipped: 本次未执行（上游失败 / 条件不满足），重跑时仍会处理
+FORCE = os.getenv("CME_FORCE_RERUN") == "1"   # 忽略日志，所有单元重新执行
+
+_lock = threading.Lock()
+_journals = {}
+
+def _name(date_str):
+    return f"{JOURNAL_DIR}/{date_str}.json"
+
+def load(date_str):
+    """某天的完整日志（进程内缓存）"""
+    with _lock:
+        if date_str not in _journals:
+            _journals[date_str] = cme_store.load_json(_name(date_str), {})
+        return _journals[date_str]
+
+def output_hash(data):
+    """任意可 JSON 序列化对象的稳定哈希"""
+    return hashlib.sha256(json.dumps(data, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def get(date_str, stage, unit):
+    return load(date_str).get(stage, {}).get(unit)
+
+def record(date_str, stage, unit, status, digest=None, **data):
+    """写入一个单元的结果，立即落盘（中途崩溃也不会丢掉已完成的单元）"""
+    journal = load(date_str)
+    with _lock:
+        journal.setdefault(stage, {})[unit] = {
+            "status": status, "hash": digest, "at": datetime.now().isoformat(timespec="seconds"), **data,
+        }
+        cme_store.save_json(_name(date_str), journal)
+
+def is_done(date_str, stage, unit, digest=None):
+    """已成功；给出 digest 时还要求输出哈希一致"""
+    if FORCE:
+        return False
+    entry = get(date_str, stage, unit)
+    if not entry or entry["status"] != DONE:
+        return False
+    return digest is None or entry.get("hash") == digest
+
+def pending(date_str, stage, units):
+    """还需要执行的单元：失败过的、跳过的、没有记录的"""
+    return [u for u in units if not is_done(date_str, stage, u)]
+
+def summary(date_str):
+    """{stage: {status: 数量}}"""
+    return {stage: {s: sum(1 for e in units.values() if e["status"] == s) for s in (DONE, FAILED, SKIPPED)}
+            for stage, units in load(date_str).items()}
@@ -0,0 +1,177 @@
+import os
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+import cme_config
+import cme_store
+import cme_trace
+
+# ==========================================
+# 共用 Notion 客户端：连接复用 + 按日期批量查询 + 限速/429 重试
+# ==========================================
+NOTION_TOKEN = cme_config.NOTION_TOKEN
+NOTION_API_URL = cme_config.NOTION_API_URL
+NOTION_VERSION = "2022-06-28"
+
+RATE_PER_SECOND = float(os.getenv("NOTION_RATE", "3"))   # Notion 官方限制约 3 req/s
+MAX_RETRIES = 5
+TIMEOUT = 30
+SNAPSHOT_NAME = "notion_snapshot.json"   # 每个页面最近一次成功写入的属性值
+FORCE_WRITE = os.getenv("NOTION_FORCE_WRITE") == "1"   # 忽略快照，全部重写（Notion 里被手工改过时用）
+
+class TokenBucket:
+    """线程安全的令牌桶：平均 rate 次/秒，允许 capacity 次突发"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+bucket = TokenBucket(RATE_PER_SECOND)
+failures = []      # 本次运行中最终失败的请求，供脚本结束时汇报
+_session = None
+_date_cache = {}   # (database_id, date) -> {metal: page}
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+def session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        _session.headers.update({
+            "Authorization": f"Bearer {NOTION_TOKEN}",
+            "Notion-Version": NOTION_VERSION,
+            "Content-Type": "application/json",
+        })
+    return _session
+
+def request(method, path, payload=None):
+    """发送请求并检查返回码；429 按 Retry-After 等待，5xx / 网络异常指数退避。失败返回 None"""
+    url = f"{NOTION_API_URL}/{path.lstrip('/')}"
+    for attempt in range(MAX_RETRIES):
+        bucket.acquire()
+        try:
+            res = session().request(method, url, json=payload, timeout=TIMEOUT)
+        except requests.RequestException as e:
+            print(f"⚠️ Notion 请求异常 ({method} {path}): {e}")
+            cme_trace.retry("Notion")
+            time.sleep(2 ** attempt)
+            continue
+        if res.status_code == 429:
+            wait = float(res.headers.get("Retry-After", 2 ** attempt))
+            print(f"⏳ Notion 限流，{wait:.1f}s 后重试 ({method} {path})")
+            cme_trace.retry("Notion")
+            time.sleep(wait)
+            continue
+        if res.status_code >= 500:
+            cme_trace.retry("Notion")
+            time.sleep(2 ** attempt)
+            continue
+        if res.status_code != 200:
+            print(f"❌ Notion {method} {path} 失败 ({res.status_code}): {res.text[:300]}")
+            failures.append((method, path, res.status_code))
+            return None
+        return res.json()
+    print(f"❌ Notion {method} {path} 重试 {MAX_RETRIES} 次后仍失败")
+    failures.append((method, path, None))
+    return None
+
+def query_date(database_id, date_str, refresh=False):
+    """一次过滤查询取出某天的所有行，返回 {Metal Type: page}，本次运行内缓存；查询失败返回 None"""
+    key = (database_id, date_str)
+    if key in _date_cache and not refresh:
+        return _date_cache[key]
+    pages = {}
+    payload = {"filter": {"property": "Date", "date": {"equals": date_str}}, "page_size": 100}
+    while True:
+        res = request("POST", f"databases/{database_id}/query", payload)
+        if res is None:
+            return None   # 查询失败不缓存，下次调用会重试
+        for page in res.get("results", []):
+            select = page["properties"].get("Metal Type", {}).get("select") or {}
+            if select.get("name"):
+                pages.setdefault(select["name"], page)
+        if not res.get("has_more"):
+            break
+        payload["start_cursor"] = res["next_cursor"]
+    _date_cache[key] = pages
+    return pages
+
+def snapshot():
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = cme_store.load_json(SNAPSHOT_NAME, {})
+    return _snapshot
+
+def _remember(page_id, properties):
+    with _snapshot_lock:
+        snapshot().setdefault(page_id, {}).update(properties)
+        cme_store.save_json(SNAPSHOT_NAME, _snapshot)
+
+def changed_properties(page_id, properties):
+    """与上次写入的快照做属性级 diff，只返回有变化的属性"""
+    if FORCE_WRITE:
+        return dict(properties)
+    last = snapshot().get(page_id, {})
+    return {name: value for name, value in properties.items() if last.get(name) != value}
+
+def _as_read(value):
+    """写入格式的属性值 -> 查询返回的格式（rich_text / title 补上 plain_text，其余格式相同）"""
+    value = dict(value)
+    for key in ("rich_text", "title"):
+        if key in value:
+            value[key] = [{**item, "plain_text": item.get("text", {}).get("content", "")} for item in value[key]]
+    return value
+
+def _update_cached(page_id, properties):
+    """把写入成功的属性合并进当天缓存中的页面：同一进程里后续阶段读到的是写入后的值"""
+    for pages in _date_cache.values():
+        for page in pages.values():
+            if page["id"] == page_id:
+                page.setdefault("properties", {}).update({k: _as_read(v) for k, v in properties.items()})
+
+def update_page(page_id, properties):
+    """只 PATCH 有变化的属性；全部未变化时不发请求。成功（或无需写入）返回 True"""
+    changed = changed_properties(page_id, properties)
+    if not changed:
+        print(f"⏭️ 无变化，跳过写入: {page_id}")
+        return True
+    if request("PATCH", f"pages/{page_id}", {"properties": changed}) is None:
+        return False
+    _remember(page_id, changed)
+    _update_cached(page_id, changed)
+    return True
+
+def create_page(database_id, properties):
+    """新建一行；成功后写入当天缓存和快照"""
+    page = request("POST", "pages", {"parent": {"database_id": database_id}, "properties": properties})
+    if page is None:
+        return None
+    _remember(page["id"], properties)
+    date = (properties.get("Date", {}).get("date") or {}).get("start")
+    metal = (properties.get("Metal Type", {}).get("select") or {}).get("name")
+    if (database_id, date) in _date_cache and metal:
+        _date_cache[(database_id, date)][metal] = page
+    return page
+
+def report_failures():
+    """打印本次运行中失败的 Notion 请求，返回失败数"""
+    if failures:
+        print(f"❌ {len(failures)} 个 Notion 请求失败: " + ", ".join(f"{m} {p}" for m, p, _ in failures))
+    return len(failures)
@@ -0,0 +1,144 @@
+import sys
+import time
+import requests
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import cme_config
+import cme_store
+import cme_trace
+
+# ==========================================
+# CME Open Interest：并发抓取 + 本地缓存（按产品、日期保存完整响应）
+# ==========================================
+# CME OI 产品 ID
+OI_CONFIG = {
+    "Gold": 437, "Silver": 450, "Copper": 446, "Platinum": 462, 
+    "Palladium": 464, "Aluminum": 8416, "Zinc": 8417, "Lead": 8418
+}
+CME_API_URL = cme_config.CME_API_URL
+CME_VOLUME_URL = CME_API_URL + "/CmeWS/mvc/Volume/Details/F/{product_id}/{cme_date}/P"
+MAX_WORKERS = 8
+MAX_RETRIES = 3      # 429 / 5xx / 网络异常才重试；404 和空响应表示未发布或非交易日
+MAX_BACKOFF = 30
+TIMEOUT = 15
+
+def cache_name(product_id, date_str):
+    return f"oi/{product_id}/{date_str}.json"
+
+def _int(value):
+    """把 "12,345" 转成整数；无法解析返回 None（不能当作 0 写进 Notion）"""
+    try:
+        return int(str(value).replace(',', ''))
+    except (TypeError, ValueError):
+        return None
+
+def _backoff(response, attempt):
+    """429 优先按 Retry-After，其余（5xx / 网络异常）指数退避"""
+    if response is not None and response.status_code == 429:
+        try:
+            return min(MAX_BACKOFF, float(response.headers["Retry-After"]))
+        except (KeyError, TypeError, ValueError):
+            pass
+    return 2 ** attempt
+
+def fetch_raw(product_id, date_str, refresh=False):
+    """某产品某天的完整 Volume/OI 响应；优先读缓存，失败返回 None（不会当作 0）"""
+    name = cache_name(product_id, date_str)
+    if not refresh:
+        cached = cme_store.load_json(name)
+        if cached is not None:
+            return cached
+
+    # 注意：CME 链接通常需要格式为 YYYYMMDD
+    url = CME_VOLUME_URL.format(product_id=product_id, cme_date=date_str.replace("-", ""))
+    for attempt in range(MAX_RETRIES):
+        r = None
+        try:
+            r = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=TIMEOUT)
+            if r.status_code == 429 or r.status_code >= 500:
+                raise RuntimeError(f"状态码 {r.status_code}")
+            if r.status_code == 404:
+                print(f"⚠️ OI 无数据: {product_id} {date_str} (404)")
+                return None   # 非交易日或尚未发布，不重试
+            if r.status_code != 200:
+                print(f"❌ OI 请求失败: {product_id} {date_str} (状态码: {r.status_code})")
+                return None
+            data = r.json()
+        except Exception as e:
+            print(f"⚠️ OI 请求异常 ({product_id} {date_str}, 尝试 {attempt + 1}/{MAX_RETRIES}): {e}")
+            if attempt < MAX_RETRIES - 1:
+                cme_trace.retry("CME")
+                time.sleep(_backoff(r, attempt))
+            continue
+        if not data or not data.get('items'):
+            print(f"⚠️ OI 无数据: {product_id} {date_str} (空响应)")
+            return None   # 非交易日或尚未发布，不重试
+        if _open_interests(data) is None:
+            print(f"❌ OI 数值无法解析: {product_id} {date_str}，本次按失败处理")
+            return None   # 不写缓存，下次重新抓取
+        cme_store.save_json(name, data)
+        return data
+    return None
+
+def contracts(raw):
+    """逐合约的 [{month, volume, oi}]，保持 CME 返回的顺序（近月在前）"""
+    return [{"month": i.get("month"), "volume": _int(i.get("totalVolume")), "oi": _int(i.get("openInterest"))}
+            for i in raw.get("items", [])]
+
+def _open_interests(raw):
+    """各合约持仓量：缺失 / 空值的合约跳过；有值但无法解析时返回 None（整个品种按失败处理）"""
+    ois = []
+    for item in raw.get("items", []):
+        value = item.get("openInterest")
+        if value is None or not str(value).strip():
+            continue
+        oi = _int(value)
+        if oi is None:
+            return None
+        ois.append(oi)
+    return ois
+
+def max_oi(raw):
+    """最大的一笔持仓量（通常是主力合约）；数值无法解析返回 None"""
+    ois = _open_interests(raw)
+    return None if ois is None else max(ois, default=0)
+
+def front_month_oi(raw):
+    """最近一个仍有持仓的合约月份的持仓量；数值无法解析返回 None"""
+    ois = _open_interests(raw)
+    return None if ois is None else next((oi for oi in ois if oi), 0)
+
+def total_oi(raw):
+    """所有合约持仓量合计；数值无法解析返回 None"""
+    ois = _open_interests(raw)
+    return None if ois is None else sum(ois)
+
+def fetch_all(date_str, metals=None, refresh=False):
+    """并发抓取所有品种，返回 {metal: 原始响应 或 None}"""
+    metals = metals or list(OI_CONFIG)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {m: pool.submit(fetch_raw, OI_CONFIG[m], date_str, refresh) for m in metals}
+        return {m: f.result() for m, f in futures.items()}
+
+def oi_values(date_str, metric=max_oi):
+    """{metal: OI 或 None}；None 表示抓取失败，调用方不应写入"""
+    return {m: (metric(raw) if raw else None) for m, raw in fetch_all(date_str).items()}
+
+def backfill(start, end):
+    """补抓 [start, end] 区间内每个工作日的 OI（已缓存的日期不会重复请求）"""
+    day = datetime.strptime(start, "%Y-%m-%d")
+    last = datetime.strptime(end, "%Y-%m-%d")
+    while day <= last:
+        if day.weekday() < 5:
+            date_str = day.strftime("%Y-%m-%d")
+            results = fetch_all(date_str)
+            missing = [m for m, raw in results.items() if raw is None]
+            print(f"{'⚠️' if missing else '✅'} {date_str}: {len(results) - len(missing)}/{len(results)}"
+                  + (f" 缺失 {', '.join(missing)}" if missing else ""))
+        day += timedelta(days=1)
+
+if __name__ == "__main__":
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    start = sys.argv[1] if len(sys.argv) > 1 else yesterday
+    end = sys.argv[2] if len(sys.argv) > 2 else start
+    backfill(start, end)
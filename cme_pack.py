@@ -0,0 +1,226 @@
+import os
+import re
+import json
+import mmap
+import zlib
+import argparse
+import threading
+from datetime import datetime
+import cme_archive
+
+# ==========================================
+# 月度归档包：把 data/<日期>/ 的原始文件按月打包，带字典压缩和随机访问索引
+# ==========================================
+# data/packs/<YYYY-MM>-<哈希>.pack  压缩块依次拼接（文件名带内容哈希，重新打包不会覆盖正在读的包）
+# data/packs/<YYYY-MM>.json          索引 {"pack", "codec", "files": {date: {filename: {offset, length, size, sha256, base}}}}
+#
+# 每个文件名以当月第一次出现的版本为字典（base），后续各天只存与它的差异：
+# 同名报表每天只改几行数字，压缩后通常只有几 KB。base 本身不带字典压缩。
+# 读取时 mmap 整个包，只解压需要的那一块（以及缓存的 base），不必解开整个月。
+PACK_DIR = os.path.join(cme_archive.DATA_DIR, "packs")
+PACK_VERSION = 1
+ZSTD_LEVEL = 19
+ZLIB_WINDOW = 32768   # zlib 字典最多用到最后 32KB
+
+try:
+    import zstandard
+    CODEC = "zstd"
+except ImportError:   # 没装 zstandard 时退回标准库 zlib（同样支持预置字典）
+    zstandard = None
+    CODEC = "zlib"
+
+_packs = {}
+_packs_lock = threading.Lock()
+
+def index_path(month):
+    return os.path.join(PACK_DIR, f"{month}.json")
+
+def list_months():
+    if not os.path.isdir(PACK_DIR):
+        return []
+    return sorted(name[:-5] for name in os.listdir(PACK_DIR) if re.fullmatch(r"\d{4}-\d{2}\.json", name))
+
+def compress(content, codec, base=None):
+    if codec == "zstd":
+        dict_data = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT) if base else None
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data).compress(content)
+    compressor = zlib.compressobj(9, zdict=base[-ZLIB_WINDOW:]) if base else zlib.compressobj(9)
+    return compressor.compress(content) + compressor.flush()
+
+def decompress(block, codec, base=None):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("该归档包使用 zstd 压缩，需要安装 zstandard")
+        dict_data = zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT) if base else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(block)
+    decompressor = zlib.decompressobj(zdict=base[-ZLIB_WINDOW:]) if base else zlib.decompressobj()
+    return decompressor.decompress(block) + decompressor.flush()
+
+class Pack:
+    """一个月的归档包（只读，mmap 随机访问，线程安全）"""
+
+    def __init__(self, month):
+        with open(index_path(month), encoding="utf-8") as f:
+            self.index = json.load(f)
+        self.codec = self.index["codec"]
+        self.files = self.index["files"]
+        path = os.path.join(PACK_DIR, self.index["pack"])
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+        self._bases = {}
+        self._lock = threading.Lock()
+
+    def _block(self, entry):
+        return self._map[entry["offset"]:entry["offset"] + entry["length"]]
+
+    def _base(self, filename):
+        with self._lock:
+            if filename not in self._bases:
+                entry = self.index["bases"][filename]
+                self._bases[filename] = decompress(self._block(entry), self.codec)
+            return self._bases[filename]
+
+    def has(self, date_str, filename):
+        return filename in self.files.get(date_str, {})
+
+    def read(self, date_str, filename):
+        entry = self.files.get(date_str, {}).get(filename)
+        if entry is None:
+            return None
+        base = self._base(entry["base"]) if entry["base"] else None
+        return decompress(self._block(entry), self.codec, base)
+
+def open_pack(month):
+    """按月缓存打开的包；该月没有包返回 None"""
+    with _packs_lock:
+        if month not in _packs:
+            _packs[month] = Pack(month) if os.path.exists(index_path(month)) else None
+        return _packs[month]
+
+def packed_dates():
+    dates = set()
+    for month in list_months():
+        dates.update(open_pack(month).files)
+    return dates
+
+def has_file(date_str, filename):
+    pack = open_pack(date_str[:7])
+    return bool(pack and pack.has(date_str, filename))
+
+def list_files(date_str):
+    pack = open_pack(date_str[:7])
+    return sorted(pack.files.get(date_str, {})) if pack else []
+
+def read_file(date_str, filename):
+    """从包中读出单个文件，不存在返回 None"""
+    pack = open_pack(date_str[:7])
+    return pack.read(date_str, filename) if pack else None
+
+def collect_month(month):
+    """某月所有原始文件（包内已有的 + 松散文件，松散文件优先），返回 {date: {filename: bytes}}"""
+    pack = open_pack(month)
+    days = {}
+    for date_str in sorted(set(pack.files) if pack else set()):
+        days[date_str] = {name: pack.read(date_str, name) for name in pack.files[date_str]}
+    for date_str in cme_archive.list_loose_dates():
+        if date_str[:7] != month:
+            continue
+        folder = os.path.join(cme_archive.DATA_DIR, date_str)
+        for filename in sorted(os.listdir(folder)):
+            if filename.endswith(cme_archive.DERIVED_SUFFIXES):
+                continue
+            with open(os.path.join(folder, filename), "rb") as f:
+                days.setdefault(date_str, {})[filename] = f.read()
+    return days
+
+def write_pack(month, days, codec=CODEC):
+    """把 {date: {filename: bytes}} 写成一个包；相同内容只存一份。返回 (原始字节数, 压缩后字节数)"""
+    os.makedirs(PACK_DIR, exist_ok=True)
+    blocks, bases, base_content, by_hash, files = [], {}, {}, {}, {}
+    offset = raw_size = 0
+
+    def append(block):
+        nonlocal offset
+        blocks.append(block)
+        offset += len(block)
+        return {"offset": offset - len(block), "length": len(block)}
+
+    for date_str in sorted(days):
+        files[date_str] = {}
+        for filename, content in sorted(days[date_str].items()):
+            raw_size += len(content)
+            digest = cme_archive.sha256_bytes(content)
+            if digest not in by_hash:
+                if filename not in bases:
+                    bases[filename] = append(compress(content, codec))
+                    base_content[filename] = content
+                    by_hash[digest] = {**bases[filename], "base": None}
+                else:
+                    by_hash[digest] = {**append(compress(content, codec, base_content[filename])), "base": filename}
+            files[date_str][filename] = {**by_hash[digest], "size": len(content), "sha256": digest}
+
+    data = b"".join(blocks)
+    pack_name = f"{month}-{cme_archive.sha256_bytes(data)[:12]}.pack"
+    index = {"version": PACK_VERSION, "month": month, "pack": pack_name, "codec": codec, "bases": bases,
+             "files": files, "created": datetime.now().isoformat(timespec="seconds")}
+    # 先写新包，再原子替换索引：读者只认索引，中途失败时旧索引仍指向旧包
+    with open(os.path.join(PACK_DIR, pack_name + ".tmp"), "wb") as f:
+        f.write(data)
+    os.replace(os.path.join(PACK_DIR, pack_name + ".tmp"), os.path.join(PACK_DIR, pack_name))
+    with open(index_path(month) + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(index_path(month) + ".tmp", index_path(month))
+    with _packs_lock:
+        _packs.pop(month, None)
+    for name in os.listdir(PACK_DIR):
+        if name.startswith(month + "-") and name.endswith(".pack") and name != pack_name:
+            os.remove(os.path.join(PACK_DIR, name))   # 已打开的旧包在 Linux 上仍可继续读完
+    return raw_size, len(data)
+
+def verify_month(month, days):
+    """逐个文件比对包内容和原始字节"""
+    pack = open_pack(month)
+    return all(pack.read(d, name) == content for d, files in days.items() for name, content in files.items())
+
+def prune_loose(month):
+    """删除已经打包的松散文件（只删除与包内容一致的文件，派生缓存一并删除）"""
+    pack = open_pack(month)
+    for date_str in cme_archive.list_loose_dates():
+        if date_str[:7] != month or date_str not in pack.files:
+            continue
+        folder = os.path.join(cme_archive.DATA_DIR, date_str)
+        for filename in os.listdir(folder):
+            path = os.path.join(folder, filename)
+            if filename.endswith(cme_archive.DERIVED_SUFFIXES):
+                os.remove(path)
+                continue
+            with open(path, "rb") as f:
+                if pack.read(date_str, filename) == f.read():
+                    os.remove(path)
+        if not os.listdir(folder):
+            os.rmdir(folder)
+
+def pack_month(month, prune=False):
+    days = collect_month(month)
+    if not days:
+        print(f"⚠️ {month} 没有可打包的文件")
+        return
+    raw_size, packed_size = write_pack(month, days)
+    if not verify_month(month, days):
+        raise RuntimeError(f"{month} 打包校验失败")
+    print(f"📦 {month}: {len(days)} 天, {raw_size / 1e6:.1f}MB -> {packed_size / 1e6:.2f}MB ({CODEC})")
+    if prune:
+        prune_loose(month)
+        print(f"🧹 {month} 松散文件已删除")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把 data/ 下的每日原始文件按月打包")
+    parser.add_argument("months", nargs="*", help="要打包的月份 YYYY-MM（默认：当月之前所有有松散文件的月份）")
+    parser.add_argument("--prune", action="store_true",
+                        help="打包并校验后删除松散文件（Notion 中的 raw 链接指向松散文件，GitHub 上的归档不要删）")
+    args = parser.parse_args()
+
+    current = datetime.now().strftime("%Y-%m")
+    months = args.months or sorted({d[:7] for d in cme_archive.list_loose_dates() if d[:7] < current})
+    for month in months:
+        pack_month(month, args.prune)
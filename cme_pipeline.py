@@ -0,0 +1,139 @@
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import cme_journal
+import cme_trace
+
+# ==========================================
+# 单进程流水线：按依赖关系调度各阶段，阶段之间直接在内存里传递结果
+# ==========================================
+# 各阶段模块在阶段函数内部才导入：只跑某一个阶段时不会加载其他阶段的重依赖
+
+class Stage:
+    def __init__(self, name, func, deps=()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+def stage_fetch(date_str, inputs):
+    """下载 CME 文件并归档（写入本地 data/ 和 GitHub）"""
+    import cme_bot
+    if not cme_bot.SCRAPER_API_KEY:
+        raise RuntimeError("未检测到有效的 SCRAPER_API_KEY")
+    manifest, changed, failed = cme_bot.run_fetch(date_str)
+    if failed:
+        raise RuntimeError(f"以下文件同步失败: {', '.join(failed)}")
+    return {"manifest": manifest, "files": changed}
+
+def stage_inventory(date_str, inputs):
+    """库存 XLS 增量入库"""
+    import cme_inventory
+    return cme_inventory.ingest_new_dates()
+
+def stage_delivery(date_str, inputs):
+    """解析交收 PDF，结构化记录入库"""
+    import cme_data_update
+    import cme_delivery
+    pdf_path = cme_data_update.locate_report(date_str)
+    return cme_delivery.ingest_report(pdf_path) if pdf_path else None
+
+def stage_oi(date_str, inputs):
+    """抓取各品种 Open Interest"""
+    import cme_oi
+    return cme_oi.oi_values(date_str)
+
+def stage_sync(date_str, inputs):
+    """同步文件链接到 Notion（必要时新建当天的行）"""
+    import notion_sync
+    notion_sync.sync_to_notion(date_str)
+
+def stage_extract(date_str, inputs):
+    """OI / 交收明细 / Activity Note 写入 Notion"""
+    import cme_data_update
+    cme_data_update.run_analysis(date_str, records=inputs.get("delivery"), oi_values=inputs.get("oi"))
+
+def stage_analyse(date_str, inputs):
+    """Gemini 市场研判"""
+    import cme_ai_analysis
+    cme_ai_analysis.run_analysis(date_str)
+
+STAGES = [
+    Stage("fetch", stage_fetch),
+    Stage("inventory", stage_inventory, ["fetch"]),
+    Stage("delivery", stage_delivery, ["fetch"]),
+    Stage("oi", stage_oi),
+    Stage("sync", stage_sync, ["fetch"]),
+    Stage("extract", stage_extract, ["sync", "inventory", "delivery", "oi"]),
+    Stage("analyse", stage_analyse, ["extract"]),
+]
+
+def run_stage(stage, date_str, inputs):
+    started = time.time()
+    print(f"▶️ [{stage.name}] 开始")
+    with cme_trace.timer("stage", stage.name):
+        result = stage.func(date_str, inputs)
+    print(f"✅ [{stage.name}] 完成 ({time.time() - started:.1f}s)")
+    return result
+
+def run_pipeline(date_str, selected=None, workers=4):
+    """运行流水线；selected 只运行指定阶段（未选中的上游视为已完成，由阶段自行加载输入）。返回失败的阶段"""
+    stages = [s for s in STAGES if not selected or s.name in selected]
+    names = {s.name for s in stages}
+    pending = {s.name: s for s in stages}
+    results, failed, running = {}, set(), {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            progressed = True
+            while progressed:
+                progressed = False
+                for name, stage in list(pending.items()):
+                    deps = [d for d in stage.deps if d in names]
+                    if any(d in failed for d in deps):
+                        print(f"⏭️ [{name}] 上游失败，跳过")
+                        cme_journal.record(date_str, "pipeline", name, cme_journal.SKIPPED)
+                        failed.add(name)
+                    elif all(d in results for d in deps):
+                        inputs = {d: results[d] for d in deps}
+                        running[pool.submit(run_stage, stage, date_str, inputs)] = name
+                    else:
+                        continue
+                    del pending[name]
+                    progressed = True
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                    cme_journal.record(date_str, "pipeline", name, cme_journal.DONE)
+                except Exception as e:
+                    print(f"❌ [{name}] 失败: {e}")
+                    cme_journal.record(date_str, "pipeline", name, cme_journal.FAILED, error=str(e)[:300])
+                    failed.add(name)
+    return sorted(failed)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CME 每日流水线")
+    parser.add_argument("stages", nargs="*", help=f"只运行这些阶段（可选: {', '.join(s.name for s in STAGES)}）")
+    parser.add_argument("--date", default=(datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"))
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    unknown = set(args.stages) - {s.name for s in STAGES}
+    if unknown:
+        parser.error(f"未知阶段: {', '.join(sorted(unknown))}")
+
+    print(f"🚀 流水线启动日期: {args.date}")
+    cme_trace.install()
+    failed = run_pipeline(args.date, args.stages, args.workers)
+    notion = sys.modules.get("cme_notion")
+    notion_failures = notion.report_failures() if notion else 0
+    if failed:
+        print(f"❌ 失败阶段: {', '.join(failed)}")
+    cme_trace.finish("pipeline", args.date, failed=failed, notion_failures=notion_failures,
+                     journal=cme_journal.summary(args.date))
+    sys.exit(1 if failed or notion_failures else 0)
@@ -0,0 +1,80 @@
+import time
+import cme_store
+import cme_trace
+
+# ==========================================
+# Yahoo 期货价格：一次批量下载 + 本地增量缓存
+# ==========================================
+# COMEX 锌 / 铅在 Yahoo 上没有可用的期货代码，暂不覆盖
+TICKERS = {
+    "Gold": "GC=F", "Silver": "SI=F", "Platinum": "PL=F", "Copper": "HG=F",
+    "Palladium": "PA=F", "Aluminum": "ALI=F"
+}
+DATASET = "prices"
+HISTORY_START = "2026-01-01"   # 与 data/ 归档起点对齐
+COLUMNS = ["date", "metal", "ticker", "open", "high", "low", "close", "volume"]
+
+def load_prices():
+    """缓存中的全部日线（date 为 YYYY-MM-DD 字符串）"""
+    import pandas as pd   # 只在读写缓存时才加载 pandas，导入本模块不受影响
+    df = cme_store.read_table(DATASET)
+    return df if not df.empty else pd.DataFrame(columns=COLUMNS)
+
+def _to_rows(hist, tickers):
+    """yf.download 的 (字段, 代码) 多级列展开为长表"""
+    import pandas as pd
+    frames = []
+    for metal, sym in tickers.items():
+        try:
+            sub = hist.xs(sym, axis=1, level=1) if isinstance(hist.columns, pd.MultiIndex) else hist
+        except KeyError:
+            continue
+        sub = sub.dropna(subset=["Close"])
+        if sub.empty:
+            continue
+        frames.append(pd.DataFrame({
+            "date": sub.index.strftime("%Y-%m-%d"), "metal": metal, "ticker": sym,
+            "open": sub["Open"].values, "high": sub["High"].values, "low": sub["Low"].values,
+            "close": sub["Close"].values, "volume": sub["Volume"].values,
+        }))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUMNS)
+
+def update_prices(tickers=TICKERS):
+    """只下载缓存末尾之后的日线（末尾那根会重新拉取，防止盘中数据不完整），返回合并后的全部数据"""
+    import pandas as pd
+    import yfinance as yf   # 只读缓存时不需要加载 yfinance
+
+    cached = load_prices()
+    if cached.empty or set(tickers.values()) - set(cached["ticker"]):
+        start = HISTORY_START
+    else:
+        start = cached.groupby("ticker")["date"].max().min()
+    print(f"📈 批量下载 {len(tickers)} 个品种价格 (自 {start})")
+    # yfinance 不经过 requests.Session，手动记入 trace
+    started = time.perf_counter()
+    hist = yf.download(list(tickers.values()), start=start, progress=False, auto_adjust=False, group_by="column")
+    cme_trace.record_http("Yahoo", time.perf_counter() - started, 200 if not hist.empty else None)
+    fresh = _to_rows(hist, tickers)
+    if fresh.empty:
+        print("⚠️ 未下载到新的价格数据")
+        return cached
+
+    merged = pd.concat([cached, fresh], ignore_index=True)
+    merged = merged.drop_duplicates(subset=["date", "ticker"], keep="last")
+    merged = merged.sort_values(["date", "metal"], ignore_index=True)
+    cme_store.write_table(DATASET, merged)
+    return merged
+
+def latest_change(prices, metal, as_of=None):
+    """截至 as_of（含）的最新收盘价及相对前一根的涨跌幅 %，数据不足返回 None"""
+    bars = prices[prices["metal"] == metal]
+    if as_of:
+        bars = bars[bars["date"] <= as_of]
+    if len(bars) < 2:
+        return None
+    prev, price = bars["close"].iloc[-2], bars["close"].iloc[-1]
+    return float(price), float((price - prev) / prev * 100)
+
+if __name__ == "__main__":
+    prices = update_prices()
+    print(f"✅ 缓存共 {len(prices)} 根日线，最新 {prices['date'].max() if len(prices) else '-'}")
@@ -0,0 +1,175 @@
+import os
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+import cme_config
+import cme_trace
+
+# ==========================================
+# ScraperAPI 请求调度：按状态码分类退避 + 自适应并发 + 熔断 + 额度记账
+# ==========================================
+# - 200 / 304 成功；404 等 4xx 是源站的真实结果，不重试
+# - 429（并发超限）按 Retry-After 或指数退避，并把允许的并发减半，之后每成功一次加 1
+# - 5xx / 超时 / 网络异常 指数退避重试；全局连续失败达到阈值即熔断，剩下的请求直接失败
+# - 401 / 403（key 无效 / 额度用完）立即熔断
+# - ScraperAPI 只对成功返回和 404 扣额度；本次运行累计达到预算后不再发请求
+SCRAPER_API_KEY = cme_config.SCRAPER_API_KEY
+SCRAPER_API_URL = cme_config.SCRAPER_API_URL
+
+CONCURRENCY = int(os.getenv("CME_FETCH_WORKERS", "4"))    # 并发上限（ScraperAPI 免费档并发较低，不宜开太大）
+MAX_ATTEMPTS = int(os.getenv("SCRAPER_MAX_ATTEMPTS", "4"))
+CREDIT_BUDGET = int(os.getenv("SCRAPER_CREDIT_BUDGET", "50"))   # 每次运行最多消耗的额度（每天正常 8 个文件）
+BREAKER_THRESHOLD = int(os.getenv("SCRAPER_BREAKER_THRESHOLD", "5"))   # 连续多少次 5xx / 超时后熔断
+CREDITS_PER_REQUEST = 1   # render=false 的普通请求
+TIMEOUT = 70              # ScraperAPI 建议至少 60 秒，服务端最多重试约 60 秒
+MAX_BACKOFF = 30
+BACKOFF_BASE = {"throttled": 2.0, "server": 1.0, "network": 2.0}   # 各类失败的退避基数（秒）
+FATAL_STATUS = (401, 403)
+
+def classify(status):
+    """状态码 -> ok / throttled / server / network / fatal / client"""
+    if status is None:
+        return "network"
+    if status in (200, 304):
+        return "ok"
+    if status == 429:
+        return "throttled"
+    if status in FATAL_STATUS:
+        return "fatal"
+    if status >= 500:
+        return "server"
+    return "client"
+
+def backoff(kind, attempt, retry_after=None):
+    """指数退避 + 抖动（在 [一半, 全部] 之间随机，避免各线程同时重试）；
+    429 带 Retry-After 时至少等满服务端要求的时间，再随机多等最多一半"""
+    if retry_after is not None:
+        return min(MAX_BACKOFF, retry_after) * random.uniform(1.0, 1.5)
+    delay = min(MAX_BACKOFF, BACKOFF_BASE[kind] * 2 ** attempt)
+    return delay * random.uniform(0.5, 1.0)
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+class Scheduler:
+    """一次运行内共享的 ScraperAPI 调度器（线程安全）"""
+
+    def __init__(self, concurrency=CONCURRENCY, budget=CREDIT_BUDGET, threshold=BREAKER_THRESHOLD):
+        self.max_concurrency = concurrency
+        self.limit = concurrency       # 当前允许的并发，429 时减半
+        self.active = 0
+        self.budget = budget
+        self.threshold = threshold
+        self.credits = 0               # 已计费 + 在途请求预扣的额度
+        self.failures = 0              # 连续的 5xx / 网络失败
+        self.open_reason = None        # 熔断原因，None 表示正常
+        self.counts = {}               # 分类 -> 次数
+        self.cond = threading.Condition()
+        self._session = None
+
+    def session(self):
+        if self._session is None:
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+        return self._session
+
+    def _acquire(self):
+        """等待并发名额并预扣一次额度（在途请求也计入预算）；已熔断或额度用完返回 False"""
+        with self.cond:
+            while self.active >= self.limit and not self.open_reason:
+                self.cond.wait()
+            if self.open_reason:
+                return False
+            if self.credits + CREDITS_PER_REQUEST > self.budget:
+                self._trip(f"本次运行额度已用完 ({self.credits}/{self.budget})")
+                return False
+            self.active += 1
+            self.credits += CREDITS_PER_REQUEST
+            return True
+
+    def _release(self, kind, status):
+        with self.cond:
+            self.active -= 1
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+            if kind != "ok" and status != 404:
+                self.credits -= CREDITS_PER_REQUEST   # 不计费的返回退回预扣的额度
+            if kind in ("server", "network"):
+                self.failures += 1
+                if self.failures >= self.threshold:
+                    self._trip(f"连续 {self.failures} 次 5xx / 超时，ScraperAPI 可能不可用")
+            elif kind != "throttled":
+                self.failures = 0
+            if kind == "throttled":
+                self.limit = max(1, self.limit // 2)
+            elif kind == "ok" and self.limit < self.max_concurrency:
+                self.limit += 1
+            if kind == "fatal":
+                self._trip(f"ScraperAPI 返回 {status}（key 无效或额度已用完）")
+            self.cond.notify_all()
+
+    def _trip(self, reason):
+        if not self.open_reason:
+            self.open_reason = reason
+            print(f"🛑 ScraperAPI 熔断: {reason}，剩余请求直接失败")
+        self.cond.notify_all()
+
+    def get(self, target_url, headers=None, keep_headers=False, label=None):
+        """经 ScraperAPI 请求 target_url，成功返回 response（200 或 304），否则返回 None"""
+        label = label or target_url
+        params = {"api_key": SCRAPER_API_KEY, "url": target_url, "render": "false"}
+        if keep_headers:
+            params["keep_headers"] = "true"
+        for attempt in range(MAX_ATTEMPTS):
+            if not self._acquire():
+                return None
+            response = None
+            try:
+                response = self.session().get(SCRAPER_API_URL, params=params, headers=headers or {}, timeout=TIMEOUT)
+                kind = classify(response.status_code)
+            except Exception as e:
+                print(f"⚠️ 请求异常 ({label}): {e}")
+                kind = "network"
+            self._release(kind, response.status_code if response is not None else None)
+
+            if kind == "ok":
+                return response
+            if kind in ("client", "fatal"):
+                print(f"❌ 下载失败: {label} (状态码: {response.status_code})，不重试")
+                return None
+            if attempt == MAX_ATTEMPTS - 1 or self.open_reason:
+                break
+            wait = backoff(kind, attempt, _retry_after(response) if kind == "throttled" else None)
+            status = response.status_code if response is not None else kind
+            print(f"⏳ {label} ({status})，{wait:.1f}s 后重试 ({attempt + 2}/{MAX_ATTEMPTS})")
+            cme_trace.retry("ScraperAPI")
+            time.sleep(wait)
+        print(f"❌ 下载失败: {label}")
+        return None
+
+    def stats(self):
+        with self.cond:
+            return {"credits": self.credits, "budget": self.budget, "requests": dict(self.counts),
+                    "concurrency": self.limit, "breaker": self.open_reason}
+
+scheduler = None   # 当前这次运行的调度器（run_fetch 开始时新建），供 trace 汇总
+
+def start_run():
+    """新建一次运行的调度器：额度、熔断和并发状态都不继承上一次运行"""
+    global scheduler
+    scheduler = Scheduler()
+    return scheduler
+
+def report(run_scheduler):
+    """打印一次运行的额度 / 请求分类统计，返回 stats"""
+    stats = run_scheduler.stats()
+    if stats["requests"]:
+        detail = ", ".join(f"{k} {v}" for k, v in sorted(stats["requests"].items()))
+        print(f"💳 ScraperAPI 额度: {stats['credits']}/{stats['budget']} ({detail})")
+    return stats
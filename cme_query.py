@@ -0,0 +1,364 @@
+import os
+import sys
+import json
+import time
+import bisect
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cme_delivery
+import cme_inventory
+import cme_store
+
+# ==========================================
+# 本地查询层：库存 / 交收的预计算聚合常驻内存，新的一天入库后增量更新
+# ==========================================
+# 库存：每个 (金属, 仓库) 一条按 report_date 排序的序列，附带各窗口的滚动变化
+# 交收：每个 (金属, 合约档位, 会员) 的逐日 issued / stopped，以及按月汇总（标准 / 微型合约的手数不能相加）
+# 查询只读内存结构，不扫描文件、不访问 Notion；HTTP 服务按 store 的修改时间自动增量刷新
+FIELDS = ["registered", "eligible", "total", "net_change", "received", "withdrawn"]
+WINDOWS = (5, 20, 60)    # 滚动窗口（交易日）
+SERIES = ("standard", "micro")   # 合约档位，见 cme_delivery.contract_series
+REFRESH_SECONDS = 5      # HTTP 服务最多每隔几秒检查一次 store 是否有新数据
+
+class QueryIndex:
+    def __init__(self):
+        self.series = {}         # (metal, depository) -> {"dates": [...], field: [...]}
+        self.rolling = {}        # (metal, depository, field, window) -> [...]（与 dates 对齐，不足窗口为 None）
+        self.inventory_seen = {}  # (metal, report_date) -> 已合并行的内容签名
+        self.delivery = {}       # date -> {(metal, series, firm): [issued, stopped]}
+        self.firm_daily = {}     # (metal, series, firm) -> {date: [issued, stopped]}
+        self.monthly = {}        # (metal, series, YYYY-MM) -> {firm: [issued, stopped]}
+        self.lock = threading.RLock()
+        self.checked = 0.0
+        self.mtimes = {}         # store 文件 -> 上次读取时的修改时间
+
+    # ---------- 增量更新 ----------
+    def apply_inventory(self, rows):
+        """合并库存行（同一 report_date 的旧值被替换），只重算受影响序列的滚动窗口"""
+        touched = {}   # (metal, depository) -> 最早被改动的位置
+        with self.lock:
+            for row in rows:
+                key = (row["metal"], row["depository"])
+                s = self.series.setdefault(key, {"dates": [], **{f: [] for f in FIELDS}})
+                date = row["report_date"]
+                i = bisect.bisect_left(s["dates"], date)
+                if i < len(s["dates"]) and s["dates"][i] == date:
+                    for f in FIELDS:
+                        s[f][i] = float(row[f])
+                else:
+                    s["dates"].insert(i, date)
+                    for f in FIELDS:
+                        s[f].insert(i, float(row[f]))
+                touched[key] = min(i, touched.get(key, i))
+            for key, i in touched.items():
+                self._roll(key, i)
+
+    def _roll(self, key, start):
+        """从位置 start 开始重算滚动窗口（正常追加新的一天时只算最后一个点）"""
+        s = self.series[key]
+        for f in FIELDS:
+            values = s[f] if f in ("registered", "eligible", "total") else None
+            for w in WINDOWS:
+                out = self.rolling.setdefault((*key, f, w), [])
+                del out[start:]
+                for i in range(start, len(s["dates"])):
+                    if values is not None:
+                        # 存量字段：相对 w 个交易日前的变化
+                        out.append(values[i] - values[i - w] if i >= w else None)
+                    else:
+                        # 流量字段：最近 w 个交易日的合计
+                        out.append(sum(s[f][i - w + 1:i + 1]) if i >= w - 1 else None)
+
+    def apply_records(self, records):
+        """合并交收记录（同一 BUSINESS DATE 整体替换：先减去旧的贡献再加新的）"""
+        by_date = {}
+        for r in records:
+            key = (r["commodity"], cme_delivery.contract_series(r["contract"]), r["firm_name"])
+            agg = by_date.setdefault(r["date"], {}).setdefault(key, [0, 0])
+            agg[0] += int(r["issued"])
+            agg[1] += int(r["stopped"])
+        with self.lock:
+            for date, day in by_date.items():
+                for sign, entries in ((-1, self.delivery.get(date, {})), (1, day)):
+                    for (metal, series, firm), (issued, stopped) in entries.items():
+                        daily = self.firm_daily.setdefault((metal, series, firm), {})
+                        monthly = self.monthly.setdefault((metal, series, date[:7]), {}).setdefault(firm, [0, 0])
+                        if sign < 0:
+                            daily.pop(date, None)
+                        else:
+                            daily[date] = [issued, stopped]
+                        monthly[0] += sign * issued
+                        monthly[1] += sign * stopped
+                self.delivery[date] = day
+
+    # ---------- 从 store 加载 / 刷新 ----------
+    def _store_mtimes(self):
+        """各品种库存表 / 各交收分区文件的修改时间"""
+        mtimes = {}
+        for metal in cme_inventory.STOCK_FILES:
+            path = cme_store.table_path(f"{cme_inventory.DATASET}/metal={metal}")
+            if os.path.exists(path):
+                mtimes[("inventory", metal)] = os.path.getmtime(path)
+        for date in cme_store.list_partitions(cme_delivery.DATASET):
+            path = cme_store.partition_path(cme_delivery.DATASET, date)
+            if os.path.exists(path):
+                mtimes[("delivery", date)] = os.path.getmtime(path)
+        return mtimes
+
+    def refresh(self, force=False):
+        """只重读修改过的库存表 / 交收分区，并只合并内容有变化的 (品种, 日期)；返回是否有更新"""
+        if not force and time.time() - self.checked < REFRESH_SECONDS:
+            return False
+        self.checked = time.time()
+        mtimes = self._store_mtimes()
+        changed = [key for key, mtime in mtimes.items() if force or self.mtimes.get(key) != mtime]
+        self.mtimes = mtimes
+
+        rows, records = [], []
+        for kind, name in changed:
+            if kind == "delivery":
+                records.extend(cme_store.read_partitions(cme_delivery.DATASET, [name]).to_dict("records"))
+                continue
+            table = cme_inventory.load_inventory(name)
+            for date, group in table.groupby("report_date"):
+                group_rows = group.to_dict("records")
+                signature = hash(tuple((r["depository"], *(r[f] for f in FIELDS)) for r in group_rows))
+                if self.inventory_seen.get((name, date)) != signature:
+                    self.inventory_seen[(name, date)] = signature
+                    rows.extend(group_rows)
+        self.apply_inventory(rows)
+        self.apply_records(records)
+        return bool(rows or records)
+
+    # ---------- 查询 ----------
+    def metals(self):
+        with self.lock:
+            return sorted({m for m, _ in self.series} | {m for m, _, _ in self.firm_daily})
+
+    def inventory_series(self, metal, field="registered", depository=cme_inventory.TOTAL_DEPOSITORY, days=60):
+        """某仓库（默认合计）最近 days 个报告日的 field 值，附带各窗口的变化；没有该序列返回 None"""
+        if field not in FIELDS:
+            raise ValueError(f"未知字段 {field}，可用: {', '.join(FIELDS)}")
+        with self.lock:
+            s = self.series.get((metal, depository))
+            if not s:
+                return None
+            n = len(s["dates"])
+            points = [{"date": s["dates"][i], "value": s[field][i]} for i in range(max(0, n - days), n)]
+            latest = {f"change_{w}d": self.rolling[(metal, depository, field, w)][-1] for w in WINDOWS}
+            return {"metal": metal, "depository": depository, "field": field, "points": points, **latest}
+
+    def depositories(self, metal, date=None):
+        """某天（默认最新）各仓库的存量和各窗口变化"""
+        with self.lock:
+            result = []
+            for (m, dep), s in self.series.items():
+                if m != metal or dep == cme_inventory.TOTAL_DEPOSITORY or not s["dates"]:
+                    continue
+                i = bisect.bisect_right(s["dates"], date) - 1 if date else len(s["dates"]) - 1
+                if i < 0:
+                    continue
+                row = {"depository": dep, "date": s["dates"][i], **{f: s[f][i] for f in FIELDS}}
+                for w in WINDOWS:
+                    row[f"registered_change_{w}d"] = self.rolling[(m, dep, "registered", w)][i]
+                result.append(row)
+            return sorted(result, key=lambda r: -r["total"])
+
+    def top_firms(self, metal, month=None, since=None, until=None, side="stopped", n=10, series="standard"):
+        """某月（或日期区间）某一档合约 issued / stopped 最多的会员"""
+        if side not in ("issued", "stopped"):
+            raise ValueError(f"side 只能是 issued 或 stopped，收到 {side}")
+        if series not in SERIES:
+            raise ValueError(f"contract 只能是 {' 或 '.join(SERIES)}，收到 {series}")
+        col = 1 if side == "stopped" else 0
+        with self.lock:
+            if month:
+                totals = {firm: v for firm, v in self.monthly.get((metal, series, month), {}).items()}
+            else:
+                totals = {}
+                for (m, s, firm), days in self.firm_daily.items():
+                    if m != metal or s != series:
+                        continue
+                    for date, (issued, stopped) in days.items():
+                        if (since is None or date >= since) and (until is None or date <= until):
+                            t = totals.setdefault(firm, [0, 0])
+                            t[0] += issued
+                            t[1] += stopped
+            ranked = sorted(((firm, v) for firm, v in totals.items() if v[col]), key=lambda kv: -kv[1][col])
+            return [{"firm": firm, "issued": v[0], "stopped": v[1]} for firm, v in ranked[:n]]
+
+    def firm_history(self, firm, metal=None, since=None):
+        """某会员（名称子串，忽略空格）逐日的 issued / stopped（标准 / 微型合约分行列出）"""
+        key = firm.upper().replace(" ", "")
+        with self.lock:
+            rows = [{"date": date, "metal": m, "contract": s, "firm": name, "issued": v[0], "stopped": v[1]}
+                    for (m, s, name), days in self.firm_daily.items()
+                    if key in name.replace(" ", "") and (metal is None or m == metal)
+                    for date, v in days.items() if since is None or date >= since]
+            return sorted(rows, key=lambda r: (r["date"], r["metal"], r["contract"], r["firm"]))
+
+_index = None
+
+def get_index():
+    """进程内共用的索引，首次调用时从 store 全量构建"""
+    global _index
+    if _index is None:
+        _index = QueryIndex()
+        _index.refresh(force=True)
+    return _index
+
+# ---------- HTTP ----------
+ROUTES = {
+    "/series": lambda idx, q: idx.inventory_series(q["metal"], q.get("field", "registered"),
+                                                   q.get("depository", cme_inventory.TOTAL_DEPOSITORY),
+                                                   int(q.get("days", 60))),
+    "/depositories": lambda idx, q: idx.depositories(q["metal"], q.get("date")),
+    "/top": lambda idx, q: idx.top_firms(q["metal"], q.get("month"), q.get("since"), q.get("until"),
+                                         q.get("side", "stopped"), int(q.get("n", 10)),
+                                         q.get("contract", "standard")),
+    "/firm": lambda idx, q: idx.firm_history(q["firm"], q.get("metal"), q.get("since")),
+    "/metals": lambda idx, q: idx.metals(),
+}
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        route = ROUTES.get(url.path)
+        if route is None:
+            return self._send(404, {"error": f"未知路径，可用: {', '.join(ROUTES)}"})
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        index = get_index()
+        index.refresh()
+        try:
+            result = route(index, query)
+        except KeyError as e:
+            return self._send(400, {"error": f"缺少参数 {e}"})
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+        if result is None:
+            return self._send(404, {"error": "没有匹配的数据"})
+        return self._send(200, result)
+
+def serve(host="127.0.0.1", port=8765):
+    get_index()
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"🌐 查询服务: http://{host}:{port}{'  '.join([''] + list(ROUTES))}")
+    server.serve_forever()
+
+# ---------- 命令行 ----------
+def print_rows(rows):
+    if not rows:
+        print("⚠️ 没有匹配的记录")
+        return
+    columns = list(rows[0])
+    widths = [max(len(str(c)), *(len(fmt(r[c])) for r in rows)) for c in columns]
+    print("  ".join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print("  ".join(fmt(r[c]).rjust(w) if isinstance(r[c], (int, float)) else fmt(r[c]).ljust(w)
+                        for c, w in zip(columns, widths)))
+
+def fmt(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:,.0f}" if abs(value) >= 100 else f"{value:,.2f}"
+    return str(value)
+
+def add_arguments(parser):
+    """查询子命令的参数（cme.py query 共用）"""
+    sub = parser.add_subparsers(dest="kind", required=True)
+    p = sub.add_parser("series", help="库存序列（默认合计行的 registered）")
+    p.add_argument("metal")
+    p.add_argument("--field", default="registered", choices=FIELDS)
+    p.add_argument("--depository", default=cme_inventory.TOTAL_DEPOSITORY)
+    p.add_argument("--days", type=int, default=60)
+    p = sub.add_parser("depositories", help="各仓库存量和滚动变化")
+    p.add_argument("metal")
+    p.add_argument("--date")
+    p = sub.add_parser("top", help="issued / stopped 最多的会员")
+    p.add_argument("metal")
+    p.add_argument("--month", help="YYYY-MM")
+    p.add_argument("--since")
+    p.add_argument("--until")
+    p.add_argument("--side", default="stopped", choices=["stopped", "issued"])
+    p.add_argument("-n", type=int, default=10)
+    p.add_argument("--contract", default="standard", choices=SERIES, help="合约档位（微型合约的手数单独排名）")
+    p = sub.add_parser("firm", help="某会员逐日交收")
+    p.add_argument("firm")
+    p.add_argument("--metal")
+    p.add_argument("--since")
+    p = sub.add_parser("delivery", help="原始交收记录（按索引只读命中的分区）")
+    p.add_argument("--firm", help="会员名称（子串，忽略空格）")
+    p.add_argument("--metal")
+    p.add_argument("--since")
+    p.add_argument("--until")
+    p.add_argument("--limit", type=int, default=50, help="最多显示多少行（取最近的）")
+    p = sub.add_parser("inventory", help="原始库存行")
+    p.add_argument("--metal")
+    p.add_argument("--depository", help="仓库名称（子串）")
+    p.add_argument("--since")
+    p.add_argument("--until")
+    p.add_argument("--limit", type=int, default=50, help="最多显示多少行（取最近的）")
+    p = sub.add_parser("serve", help="启动 HTTP 查询服务")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+
+def raw_table(args):
+    """直接读 store 中的明细表（不经过内存聚合）"""
+    import pandas as pd
+    if args.kind == "delivery":
+        df = cme_delivery.query_records(args.firm, args.metal, args.since, args.until)
+    else:
+        df = cme_inventory.load_inventory(args.metal)
+        if args.since:
+            df = df[df["report_date"] >= args.since]
+        if args.until:
+            df = df[df["report_date"] <= args.until]
+        if args.depository:
+            df = df[df["depository"].str.contains(args.depository, case=False, regex=False)]
+    if df.empty:
+        print("⚠️ 没有匹配的记录")
+        return 0
+    with pd.option_context("display.max_rows", args.limit, "display.width", 200):
+        print(df.tail(args.limit).to_string(index=False))
+    return 0
+
+def run(args):
+    if args.kind == "serve":
+        serve(args.host, args.port)
+        return 0
+    if args.kind in ("delivery", "inventory"):
+        return raw_table(args)
+    index = get_index()
+    if args.kind == "series":
+        result = index.inventory_series(args.metal, args.field, args.depository, args.days)
+        if result is None:
+            print(f"⚠️ 没有 {args.metal} / {args.depository} 的库存数据")
+            return 1
+        print(" | ".join(f"{k} {fmt(result[k])}" for k in result if k.startswith("change_")))
+        print_rows(result["points"])
+    elif args.kind == "depositories":
+        print_rows(index.depositories(args.metal, args.date))
+    elif args.kind == "top":
+        print_rows(index.top_firms(args.metal, args.month, args.since, args.until, args.side, args.n, args.contract))
+    elif args.kind == "firm":
+        print_rows(index.firm_history(args.firm, args.metal, args.since))
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地库存 / 交收聚合查询")
+    add_arguments(parser)
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,81 @@
+import os
+import json
+import cme_config
+
+# ==========================================
+# 本地派生数据仓库 (store/)：按日期分区的 Parquet 数据集
+# ==========================================
+# pandas 只在读写 Parquet 时才导入：只用 JSON 缓存的脚本不必加载它
+STORE_DIR = cme_config.STORE_DIR
+
+def dataset_dir(dataset):
+    return os.path.join(STORE_DIR, dataset)
+
+def partition_path(dataset, date_str):
+    return os.path.join(dataset_dir(dataset), f"date={date_str}", "part-0.parquet")
+
+def list_partitions(dataset):
+    """数据集中已有的日期分区（升序）"""
+    root = dataset_dir(dataset)
+    if not os.path.isdir(root):
+        return []
+    return sorted(d.split("=", 1)[1] for d in os.listdir(root) if d.startswith("date="))
+
+def write_partition(dataset, date_str, df):
+    """整体覆盖写入一个日期分区（重复写入同一天是幂等的）"""
+    path = partition_path(dataset, date_str)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def read_partitions(dataset, dates=None):
+    """读取指定日期（默认全部）的分区，合并成一个 DataFrame"""
+    import pandas as pd
+    dates = list_partitions(dataset) if dates is None else sorted(dates)
+    frames = [pd.read_parquet(partition_path(dataset, d)) for d in dates
+              if os.path.exists(partition_path(dataset, d))]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+def table_path(dataset):
+    return os.path.join(dataset_dir(dataset), "data.parquet")
+
+def read_table(dataset):
+    """读取单文件数据集（不存在返回空表）"""
+    import pandas as pd
+    path = table_path(dataset)
+    return pd.read_parquet(path) if os.path.exists(path) else pd.DataFrame()
+
+def upsert_table(dataset, df, key):
+    """把 df 合并进单文件数据集：key 列值相同的旧行被替换，其余保留"""
+    import pandas as pd
+    existing = read_table(dataset)
+    if not existing.empty:
+        existing = existing[~existing[key].isin(df[key].unique())]
+        df = pd.concat([existing, df], ignore_index=True)
+    write_table(dataset, df.sort_values(key, kind="stable", ignore_index=True))
+
+def write_table(dataset, df):
+    """整体覆盖写入单文件数据集"""
+    path = table_path(dataset)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def load_json(name, default=None):
+    path = os.path.join(STORE_DIR, name)
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_json(name, data):
+    path = os.path.join(STORE_DIR, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
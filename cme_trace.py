@@ -0,0 +1,138 @@
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlparse
+import requests
+import cme_store
+
+# ==========================================
+# 运行追踪：阶段 / 品种耗时、各外部服务的 HTTP 统计、解析耗时，写成 JSON trace
+# ==========================================
+TRACE_DIR = "traces"
+
+# 域名后缀 -> 服务名；其余按原始域名归类（例如本地替身服务）
+HOSTS = {
+    "scraperapi.com": "ScraperAPI",
+    "api.github.com": "GitHub",
+    "githubusercontent.com": "GitHub",
+    "cmegroup.com": "CME",
+    "notion.com": "Notion",
+    "yahoo.com": "Yahoo",
+    "googleapis.com": "Gemini",
+}
+
+_lock = threading.Lock()
+_started = time.time()
+_timings = {}   # kind -> name -> {"count", "seconds"}
+_http = {}      # host -> {"requests", "errors", "retries", "seconds", "bytes_in", "bytes_out", "status": {}}
+_original_request = None
+
+def host_label(url):
+    netloc = urlparse(url).hostname or ""
+    for suffix, label in HOSTS.items():
+        if netloc == suffix or netloc.endswith("." + suffix):
+            return label
+    return netloc or "unknown"
+
+def _host_stats(host):
+    return _http.setdefault(host, {"requests": 0, "errors": 0, "retries": 0, "seconds": 0.0,
+                                   "bytes_in": 0, "bytes_out": 0, "status": {}})
+
+def record_http(host, seconds, status=None, bytes_in=0, bytes_out=0):
+    """记录一次请求；status 为 None 表示网络异常。非 requests 发出的请求（如 SDK）可手动调用"""
+    with _lock:
+        stats = _host_stats(host)
+        stats["requests"] += 1
+        stats["seconds"] += seconds
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+        key = str(status) if status is not None else "error"
+        stats["status"][key] = stats["status"].get(key, 0) + 1
+        if status is None or status >= 400:
+            stats["errors"] += 1
+
+def retry(host):
+    """各重试循环在决定重试时调用"""
+    with _lock:
+        _host_stats(host)["retries"] += 1
+
+def _traced_request(self, method, url, *args, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = _original_request(self, method, url, *args, **kwargs)
+    except Exception:
+        record_http(host_label(url), time.perf_counter() - started)
+        raise
+    body = response.request.body if response.request is not None else None
+    record_http(host_label(url), time.perf_counter() - started, response.status_code,
+                len(response.content or b""), len(body) if isinstance(body, (bytes, str)) else 0)
+    return response
+
+def install():
+    """给 requests.Session 打补丁，统计所有经由 requests 的请求（requests.get / PyGithub / Notion 客户端）"""
+    global _original_request
+    if _original_request is None:
+        _original_request = requests.Session.request
+        requests.Session.request = _traced_request
+
+def add_timing(kind, name, seconds):
+    with _lock:
+        entry = _timings.setdefault(kind, {}).setdefault(name, {"count": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += seconds
+
+@contextmanager
+def timer(kind, name):
+    """计时块，例如 timer("stage", "fetch") / timer("metal", "Gold") / timer("parse", "pdf")"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(kind, name, time.perf_counter() - started)
+
+def reset():
+    """清空已记录的数据（同一进程里连续跑多次时用）"""
+    global _started
+    with _lock:
+        _started = time.time()
+        _timings.clear()
+        _http.clear()
+
+def trace(label, date_str=None, **extra):
+    """当前运行的完整 trace"""
+    with _lock:
+        return {
+            "label": label,
+            "date": date_str,
+            "started": datetime.fromtimestamp(_started).isoformat(timespec="seconds"),
+            "wall_seconds": round(time.time() - _started, 3),
+            "timings": {kind: {name: {"count": e["count"], "seconds": round(e["seconds"], 3)}
+                               for name, e in names.items()} for kind, names in _timings.items()},
+            "http": {host: {**s, "seconds": round(s["seconds"], 3)} for host, s in _http.items()},
+            **extra,
+        }
+
+def summary(data):
+    """一行摘要：总耗时 | 各阶段 | 各服务请求数 / 耗时 / 流量 | 解析耗时"""
+    parts = [f"⏱️ {data['label']} {data['wall_seconds']:.1f}s"]
+    stages = data["timings"].get("stage", {})
+    if stages:
+        parts.append(" ".join(f"{name} {e['seconds']:.1f}s" for name, e in stages.items()))
+    if data["http"]:
+        parts.append(", ".join(
+            f"{host} {s['requests']}req{'/' + str(s['retries']) + 'retry' if s['retries'] else ''} "
+            f"{s['seconds']:.1f}s {s['bytes_in'] / 1e6:.1f}MB"
+            for host, s in sorted(data["http"].items(), key=lambda kv: -kv[1]["seconds"])))
+    parses = data["timings"].get("parse", {})
+    if parses:
+        parts.append("parse " + " ".join(f"{name} {e['count']}x {e['seconds']:.1f}s" for name, e in parses.items()))
+    return " | ".join(parts)
+
+def finish(label, date_str=None, **extra):
+    """写入 store/traces/<日期>/<label>-<时间>.json 并打印一行摘要"""
+    data = trace(label, date_str, **extra)
+    stamp = datetime.fromtimestamp(_started).strftime("%H%M%S")
+    cme_store.save_json(f"{TRACE_DIR}/{date_str or 'undated'}/{label}-{stamp}.json", data)
+    print(summary(data))
+    return data
@@ -1,81 +1,72 @@
-import os
-import requests
+import sys
 from datetime import datetime, timedelta
+import cme_archive
+import cme_config
+import cme_journal
+import cme_notion
+import cme_trace
 
 # 配置环境变量
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
-DATABASE_ID = "2e047eb5fd3c80d89d56e2c1ad066138" #
-GITHUB_REPO = "Curarpikt0000/cme-data-archive"
+DATABASE_ID = cme_config.DATABASE_ID
 
-HEADERS = {
-    "Authorization": f"Bearer {NOTION_TOKEN}",
-    "Notion-Version": "2022-06-28",
-    "Content-Type": "application/json"
-}
-
-METALS = {
-    "Gold": "Gold_Stocks.xls",
-    "Silver": "Silver_stocks.xls",
-    "Copper": "Copper_Stocks.xls",
-    "Aluminum": "Aluminum_Stocks.xls",
-    "Lead": "Lead_Stocks.xls",
-    "Zinc": "Zinc_Stocks.xls",
-    "Platinum": "PA-PL_Stck_Rprt.xls",
-    "Palladium": "PA-PL_Stck_Rprt.xls"
-}
+METALS = cme_config.STOCK_FILES
 
 def get_file_property_item(name, url):
     return {"files": [{"name": name, "external": {"url": url}}]}
 
-def sync_to_notion():
+def sync_to_notion(date_str=None):
     # 逻辑：使用 T-1 日期匹配 CME 报告
-    date_str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-    delivery_url = f"https://raw.githubusercontent.com/{GITHUB_REPO}/main/data/{date_str}/MetalsIssuesAndStopsReport.pdf"
+    date_str = date_str or (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    # 去重后的文件可能保存在之前的日期目录，链接按 manifest 解析
+    delivery_url = cme_archive.raw_url(date_str, "MetalsIssuesAndStopsReport.pdf")
+    if cme_archive.is_noop_day(date_str):
+        print(f"♻️ {date_str} 所有文件与上一交易日相同，链接指向原始归档")
 
+    # 1. 先在本地算好每个品种的属性；日志中已成功写入且内容相同的品种不再处理
+    wanted = {}
     for metal_type, file_name in METALS.items():
-        stock_url = f"https://raw.githubusercontent.com/{GITHUB_REPO}/main/data/{date_str}/{file_name}"
-        
-        # 1. 查询
-        query_data = {
-            "filter": {
-                "and": [
-                    {"property": "Date", "date": {"equals": date_str}},
-                    {"property": "Metal Type", "select": {"equals": metal_type}}
-                ]
-            }
-        }
-        query_res = requests.post(f"https://api.notion.com/v1/databases/{DATABASE_ID}/query", headers=HEADERS, json=query_data)
-        
-        if query_res.status_code != 200:
-            print(f"❌ Query Error for {metal_type}: {query_res.text}")
-            continue
-
-        res_json = query_res.json()
-        
+        stock_url = cme_archive.raw_url(date_str, file_name)
         # 2. 准备属性 (严格匹配 Notion 列名)
-        properties = {
+        wanted[metal_type] = {
             "Stock File": get_file_property_item(file_name, stock_url),
             "Delivery Notice": get_file_property_item("Delivery_Notice.pdf", delivery_url)
         }
+    todo = {m: p for m, p in wanted.items()
+            if not cme_journal.is_done(date_str, "sync", m, cme_journal.output_hash(p))}
+    if not todo:
+        print(f"📓 {date_str} 所有品种的链接均已同步，跳过")
+        return
+
+    # 3. 一次查询取出当天所有金属的行
+    pages = cme_notion.query_date(DATABASE_ID, date_str)
+    if pages is None:
+        print(f"❌ Query Error for {date_str}")
+        return
 
-        if res_json.get("results"):
-            # 更新链接
-            page_id = res_json["results"][0]["id"]
-            requests.patch(f"https://api.notion.com/v1/pages/{page_id}", headers=HEADERS, json={"properties": properties})
-            print(f"✅ Updated Links for {metal_type}")
-        else:
-            # 新建记录
-            new_page = {
-                "parent": {"database_id": DATABASE_ID},
-                "properties": {
+    for metal_type, properties in todo.items():
+        with cme_trace.timer("metal", f"sync:{metal_type}"):
+            if metal_type in pages:
+                # 更新链接
+                page_id = pages[metal_type]["id"]
+                ok = cme_notion.update_page(page_id, properties)
+                if ok:
+                    print(f"✅ Updated Links for {metal_type}")
+            else:
+                # 新建记录
+                new_properties = {
                     "Name": {"title": [{"text": {"content": f"{metal_type} - {date_str}"}}]}, # 修正列名
                     "Date": {"date": {"start": date_str}},
                     "Metal Type": {"select": {"name": metal_type}},
                     **properties
                 }
-            }
-            requests.post("https://api.notion.com/v1/pages", headers=HEADERS, json=new_page)
-            print(f"✅ Created Row for {metal_type}")
+                ok = cme_notion.create_page(DATABASE_ID, new_properties)
+                if ok:
+                    print(f"✅ Created Row for {metal_type}")
+            status = cme_journal.DONE if ok else cme_journal.FAILED
+            cme_journal.record(date_str, "sync", metal_type, status, cme_journal.output_hash(properties))
 
 if __name__ == "__main__":
+    cme_trace.install()
     sync_to_notion()
+    cme_trace.finish("sync", (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"))
+    sys.exit(1 if cme_notion.report_failures() else 0)